@@ -0,0 +1,227 @@
+'''
+Contains the AudioCache class
+'''
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+log = logging.getLogger(__name__)
+
+# Name of the index file within the cache directory
+INDEX_FILE = "index.json"
+
+
+def get_checksum(path: str) -> str:
+    '''
+    Returns the sha256 checksum of a file, which is read in chunks
+    '''
+
+    checksum = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            checksum.update(chunk)
+
+    return checksum.hexdigest()
+
+
+def link_or_copy(source: str, destination: str) -> None:
+    '''
+    Hard links source to destination, copies it if linking isn't possible
+    '''
+
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class AudioCache:
+    '''
+    Persistent cache of downloaded tracks, keyed by video id
+    The index file stores file name, length, gain, size, checksum and last use of every track,
+    the least recently used tracks are evicted once the size budget is exceeded
+    Tracks are handed out as hard links (or copies), so evicting a track never affects a queued one
+    All methods except get may block and should be run in an executor
+    Parameters:
+        directory: The directory containing the tracks and the index file
+        budget:    Maximum total size of all tracks in bytes
+    '''
+
+    def __init__(self, directory: str, budget: int) -> None:
+        self.directory = directory
+        self.budget = budget
+        self.index_path = os.path.join(directory, INDEX_FILE)
+
+        # Data of all cached tracks, mapped by video id
+        self.entries = dict()
+
+        # Guards entries and files, as methods run in executor threads
+        self.lock = threading.Lock()
+
+        self.load()
+
+    def load(self) -> None:
+        '''
+        Loads the index file, drops entries whose file is missing or has the wrong size
+        and deletes files which aren't in the index
+        '''
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            entries = dict()
+        except Exception as e:
+            log.error("Couldn't read audio cache index, starting empty. Error: " + str(e))
+            entries = dict()
+
+        # Keep entries whose files are intact
+        for _id, entry in entries.items():
+            path = os.path.join(self.directory, entry["file"])
+            if os.path.isfile(path) and os.path.getsize(path) == entry["size"]:
+                self.entries[_id] = entry
+            else:
+                log.warning(f"Dropping damaged audio cache entry {_id}")
+
+        # Delete files which aren't referenced
+        files = set(e["file"] for e in self.entries.values())
+        for file in os.listdir(self.directory):
+            if file != INDEX_FILE and file not in files:
+                log.warning(f"Deleting unreferenced audio cache file {file}")
+                os.remove(os.path.join(self.directory, file))
+
+        self.save()
+
+        log.info(f"Loaded audio cache with {len(self.entries)} tracks")
+
+    def save(self) -> None:
+        '''
+        Writes the index file, a crash while writing leaves the previous index intact
+        '''
+
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(temp_path, self.index_path)
+
+    def get(self, _id: str) -> dict:
+        '''
+        Returns the entry of a cached track or None if it isn't cached
+        '''
+        return self.entries.get(_id)
+
+    def restore(self, _id: str, target: str) -> tuple:
+        '''
+        Places the cached track into the target directory after verifying its checksum
+        Returns its file name, length and gain or None if it isn't cached or was damaged
+        '''
+
+        with self.lock:
+
+            entry = self.entries.get(_id)
+            if not entry:
+                return None
+
+            path = os.path.join(self.directory, entry["file"])
+
+            # Drop damaged tracks
+            if not os.path.isfile(path) or get_checksum(path) != entry["sha256"]:
+                log.warning(f"Audio cache entry {_id} is damaged, dropping it")
+                self.remove(_id)
+                self.save()
+                return None
+
+            # Place track into target directory
+            # Another track whose title results in the same file name might be there already,
+            # in which case the file name is prefixed with the video id
+            file = entry["file"]
+            destination = os.path.join(target, file)
+            if os.path.exists(destination) and not self.is_copy(destination, path, entry):
+                file = f"{_id}_{file}"
+                destination = os.path.join(target, file)
+
+            if not os.path.exists(destination):
+                link_or_copy(path, destination)
+
+            # Mark track as used
+            entry["used"] = time.time()
+            self.save()
+
+            log.info(f"Restored {_id} from audio cache")
+
+            return file, entry["length"], entry.get("gain", 0)
+
+    @staticmethod
+    def is_copy(destination: str, path: str, entry: dict) -> bool:
+        '''
+        Checks whether destination contains the cached track at path
+        '''
+
+        # Hard links are the same file
+        if os.path.samefile(destination, path):
+            return True
+
+        return os.path.getsize(destination) == entry["size"] and get_checksum(destination) == entry["sha256"]
+
+    def store(self, _id: str, path: str, length: int, gain: float = 0) -> None:
+        '''
+        Adds a downloaded track to the cache and evicts tracks if the budget is exceeded
+        '''
+
+        file = os.path.basename(path)
+        size = os.path.getsize(path)
+
+        # Tracks larger than the budget are not cached
+        if size > self.budget:
+            return
+
+        with self.lock:
+
+            # Keep file names unique
+            if any(e["file"] == file for key, e in self.entries.items() if key != _id):
+                log.warning(f"Audio cache already contains a file named {file}, not caching {_id}")
+                return
+
+            self.remove(_id)
+
+            link_or_copy(path, os.path.join(self.directory, file))
+
+            self.entries[_id] = {
+                "file": file,
+                "length": length,
+                "gain": gain,
+                "size": size,
+                "sha256": get_checksum(path),
+                "used": time.time(),
+            }
+
+            # Evict least recently used tracks
+            total = sum(e["size"] for e in self.entries.values())
+            for key in sorted(self.entries, key=lambda key: self.entries[key]["used"]):
+                if total <= self.budget:
+                    break
+                if key != _id:
+                    total -= self.entries[key]["size"]
+                    log.info(f"Evicting {key} from audio cache")
+                    self.remove(key)
+
+            self.save()
+
+    def remove(self, _id: str) -> None:
+        '''
+        Deletes a track and its entry, the lock has to be held
+        '''
+
+        entry = self.entries.pop(_id, None)
+        if not entry:
+            return
+
+        try:
+            os.remove(os.path.join(self.directory, entry["file"]))
+        except FileNotFoundError:
+            pass
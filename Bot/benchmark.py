@@ -0,0 +1,246 @@
+'''
+Exists for testing and debugging purposes only
+Measures the latency of performance critical code paths
+Usage:
+    python benchmark.py <name> [--stand-in]
+With --stand-in, a simulated MySQL server is used instead of the local database
+'''
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import discord
+from database import Database, QUEUE_KEY_GAP
+from env_vars import EnvVariables
+
+
+class StandInCursor:
+    '''
+    Cursor of the StandInConnection, every query costs one round-trip
+    '''
+
+    def __init__(self, connection) -> None:
+        self.connection = connection
+        self.with_rows = True
+
+    def execute(self, query, params=None) -> None:
+        time.sleep(self.connection.round_trip)
+
+    def fetchall(self) -> list:
+        return [(1,)]
+
+    def close(self) -> None:
+        pass
+
+
+class StandInConnection:
+    '''
+    Imitates a mysql connection with a configurable handshake and round-trip latency
+    Parameters:
+        handshake:  Seconds needed to open the connection (TCP + authentication)
+        round_trip: Seconds needed for a single query
+    '''
+
+    def __init__(self, handshake: float = 0.004, round_trip: float = 0.0003) -> None:
+        self.round_trip = round_trip
+        self.connected = True
+        self.connection_id = id(self)
+        time.sleep(handshake)
+
+    def cursor(self, *args, **kwargs) -> StandInCursor:
+        return StandInCursor(self)
+
+    def commit(self) -> None:
+        pass
+
+    def rollback(self) -> None:
+        pass
+
+    def ping(self, *args, **kwargs) -> None:
+        time.sleep(self.round_trip)
+
+    def is_connected(self) -> bool:
+
+        # The driver pings the server to find out
+        time.sleep(self.round_trip)
+        return self.connected
+
+    def close(self) -> None:
+        self.connected = False
+
+
+class StandInDatabase(Database):
+    '''
+    Database connected to StandInConnections instead of a mysql server
+    '''
+
+    def connect(self) -> StandInConnection:
+        return StandInConnection()
+
+
+def get_database(stand_in: bool) -> Database:
+    '''
+    Creates the Database object used by the benchmarks
+    '''
+
+    if stand_in:
+        return StandInDatabase(None, None)
+
+    env_var = EnvVariables()
+    db = Database(env_var.SQL_USER, env_var.SQL_PW, pool_size=env_var.SQL_POOL_SIZE)
+    db.setup()
+    return db
+
+
+def report(name: str, timings: list) -> None:
+    '''
+    Prints median and 95th percentile of the passed timings in milliseconds
+    '''
+
+    timings = sorted(timings)
+    median = statistics.median(timings) * 1000
+    p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+    print(f"{name:<30} median {median:8.3f} ms   p95 {p95:8.3f} ms   ({len(timings)} runs)")
+
+
+def bench_connection_pool(db: Database, runs: int = 500) -> None:
+    '''
+    Compares the latency of a query on a fresh connection (the previous behaviour)
+    with the latency of a query on a pooled connection
+    '''
+
+    query = "SELECT MAX(queue_id) FROM queuelist;"
+
+    # A new connection per query
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        connection = db.connect()
+        cursor = connection.cursor()
+        cursor.execute(query)
+        cursor.fetchall()
+        connection.commit()
+        cursor.close()
+        connection.close()
+        timings.append(time.perf_counter() - start)
+    report("connection per query", timings)
+
+    # Pooled connections
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        db.execute(query)
+        timings.append(time.perf_counter() - start)
+    report("pooled connection", timings)
+
+
+def bench_queue_indexes(db: Database, rows: int = 20000, runs: int = 200) -> None:
+    '''
+    Compares the hot queue list lookups on a table with rows tracks
+    without and with the indexes added by the schema migration
+    Works on two temporary copies of the queuelist table
+    '''
+
+    if isinstance(db, StandInDatabase):
+        print("Needs a mysql server, skipped")
+        return
+
+    # Create track data, 180 seconds each
+    data = list((QUEUE_KEY_GAP * i, f"https://www.youtube.com/watch?v={i:011d}", '', 180, f"Track {i}")
+                for i in range(1, rows + 1))
+
+    # The hot lookups: last track, next track and first page of the queue list
+    queries = [
+        ("max queue_id", "SELECT MAX(queue_id) FROM {}", None),
+        ("next track", "SELECT path, length, url, name FROM {} WHERE queue_id >= %s ORDER BY queue_id LIMIT 1", (QUEUE_KEY_GAP * rows // 2,)),
+        ("queue page", "SELECT name, length FROM {} WHERE queue_id >= %s ORDER BY queue_id LIMIT 20", (QUEUE_KEY_GAP * rows // 2,)),
+    ]
+
+    for table, index in (("bench_queuelist_plain", ""), ("bench_queuelist_indexed", ", INDEX queue_id (queue_id)")):
+
+        # Create and fill table
+        db.execute(f"DROP TABLE IF EXISTS {table};")
+        db.execute(" ".join([f"CREATE TABLE {table} (",
+                             "id INT AUTO_INCREMENT,",
+                             "queue_id INT NOT NULL,",
+                             "url VARCHAR(255) NOT NULL,",
+                             "path VARCHAR(255),",
+                             "length FLOAT,",
+                             "name VARCHAR(255),",
+                             f"PRIMARY KEY (id){index}",
+                             ")  ENGINE=INNODB;"]))
+        with db.transaction() as cursor:
+            cursor.executemany(f"INSERT INTO {table} (queue_id, url, path, length, name) VALUES (%s, %s, %s, %s, %s)", data)
+
+        # Measure lookups
+        for name, query, params in queries:
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                db.execute(query.format(table), params)
+                timings.append(time.perf_counter() - start)
+            report(f"{name}, {'indexed' if index else 'no index'}", timings)
+
+        db.execute(f"DROP TABLE {table};")
+
+
+def bench_seek(db: Database, runs: int = 20) -> None:
+    '''
+    Measures the latency of seeking within a downloaded track, that is creating the source
+    at the destination time until its first audio packet can be sent, which is all MyClient.seek waits for
+    Works on a three minute test tone generated with ffmpeg
+    '''
+
+    if not shutil.which("ffmpeg"):
+        print("Needs ffmpeg, skipped")
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        # Create test track
+        path = os.path.join(directory, "tone.webm")
+        subprocess.run(["ffmpeg", "-loglevel", "error", "-f", "lavfi", "-i", "sine=frequency=440:duration=180",
+                        "-c:a", "libopus", path], check=True)
+
+        # Measure seeks to the start, the middle and the end of the track
+        for destination_time in (0, 90, 170):
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                source = discord.FFmpegOpusAudio(path, before_options=f"-nostdin -ss {destination_time}")
+                source.read()
+                timings.append(time.perf_counter() - start)
+                source.cleanup()
+            report(f"seek to {destination_time} s", timings)
+
+
+# All available benchmarks
+BENCHMARKS = {
+    "pool": bench_connection_pool,
+    "indexes": bench_queue_indexes,
+    "seek": bench_seek,
+}
+
+
+if __name__ == "__main__":
+
+    # Silence the query logging of the database module
+    import logging
+    logging.disable(logging.INFO)
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("name", choices=list(BENCHMARKS) + ["all"])
+    parser.add_argument("--stand-in", action="store_true")
+    args = parser.parse_args()
+
+    db = get_database(args.stand_in)
+
+    for name, benchmark in BENCHMARKS.items():
+        if args.name in (name, "all"):
+            print(f"--- {name} ---")
+            benchmark(db)
+
+    db.close()
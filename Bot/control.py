@@ -1,10 +1,8 @@
 '''
 Handles commands which can be called from the control board
 '''
-import asyncio
 import database
 from my_client import MyClient
-from converter import format_time_ffmpeg
 import discord
 import logging
 import file_manager
@@ -19,10 +17,10 @@ class ControlBoard:
     Contains all control board commands
     Parameters:
         client: the main my_client object
-        db:     the main Database object
+        db:     the main AsyncDatabase object
     '''
 
-    def __init__(self, client: MyClient, db: database.Database) -> None:
+    def __init__(self, client: MyClient, db: database.AsyncDatabase) -> None:
 
         self.client = client
         self.db = db
@@ -44,7 +42,7 @@ class ControlBoard:
             return
 
         # Get number of songs that can be skipped
-        max_id = self.db.get_max_queue_id()
+        max_id = len(self.client.queue)
         skippable_songs = (max_id - self.client.queue_counter) + 1
 
         # Check if there are songs to skip
@@ -97,7 +95,7 @@ class ControlBoard:
 
         # Define conditions, that have to be met,
         # in order to restart song instead of playing the previous ones
-        repeat_condition = amount == 0 and self.client.vc_check() and self.client.song_timer >= 5
+        repeat_condition = amount == 0 and self.client.vc_check() and self.client.clock.position >= 5
 
         log.info(f"Going back by {amount}, with repeat_condition {repeat_condition}")
 
@@ -158,12 +156,12 @@ class ControlBoard:
 
         # Resume player if paused
         elif self.client.vc.is_paused():
-            self.client.vc.resume()
+            self.client.resume()
             await ctx.send("Resumed!", delete_after=3)
 
         # Pause player if playing
         elif self.client.vc.is_playing():
-            self.client.vc.pause()
+            self.client.pause()
             await ctx.send("Paused!", delete_after=3)
 
         # Error detection
@@ -182,28 +180,18 @@ class ControlBoard:
         log.info(f"Skipping {amount} seconds")
 
         # Get desired timeframe
-        destination_time = int(self.client.song_timer + amount)
+        destination_time = int(self.client.clock.position + amount)
 
         # Change destination time to one second before end of song if skipped too much
         if self.client.current_track_duration <= destination_time:
             destination_time = self.client.current_track_duration - 1
 
-        # Set player configuration
-        boption = "-nostdin -ss {}".format(format_time_ffmpeg(destination_time))
-
         # Fast forward if playing audio
-        if not self.client.play_with_boption(boption):
+        if not await self.client.seek(destination_time):
             log.warning("Fast forward was called although not playing audio")
             await ctx.send("Not playing audio!")
             return
 
-        # Wait until playing the next song
-        while not (self.client.vc.is_playing() or self.client.vc.is_paused()):
-            await asyncio.sleep(0.1)
-
-        # Set song timer to current timeframe
-        self.client.song_timer = destination_time
-
         await ctx.send("Fast forward complete", delete_after=3)
 
     async def rewind(self, ctx: Union[SlashContext, ComponentContext], amount: int = 10) -> None:
@@ -217,28 +205,18 @@ class ControlBoard:
         log.info(f"Rewinding {amount} seconds")
 
         # Get desired timeframe
-        destination_time = int(self.client.song_timer - amount)
+        destination_time = int(self.client.clock.position - amount)
 
         # If destination time is negative, start playing at start of song
         if destination_time < 0:
             destination_time = 0
 
-        # Set player configuration
-        boption = "-nostdin -ss {}".format(format_time_ffmpeg(destination_time))
-
         # Rewind if playing audio
-        if not self.client.play_with_boption(boption):
+        if not await self.client.seek(destination_time):
             log.warning("Rewind was called although not playing audio")
             await ctx.send("Not playing audio!")
             return
 
-        # Wait until playing the next song
-        while not (self.client.vc.is_playing() or self.client.vc.is_paused()):
-            await asyncio.sleep(0.1)
-
-        # Set song timer to current timeframe
-        self.client.song_timer = destination_time
-
         await ctx.send("Rewind complete", delete_after=3)
 
     async def stop(self, ctx: Union[SlashContext, ComponentContext], silent=False):
@@ -258,8 +236,8 @@ class ControlBoard:
             await ctx.send("Currently not playing audio")
             return
 
-        # Reset database data
-        self.db.setup()
+        # Remove all songs from queue list
+        self.client.queue.clear()
 
         # Disconnect from voice channel
         await self.client.disconnect()
@@ -273,19 +251,6 @@ class ControlBoard:
         # Stop client playback
         self.client.stop()
 
-        # Cancel update duration couroutine
-        self.client.update_duration.cancel()
-
-        # Wait until either update duration coroutine is finished
-        # or 5 seconds have passed
-        i = 0
-        while self.client.update_duration.is_running() and i < 50:
-            i += 1
-            await asyncio.sleep(0.1)
-
-        if i == 50:
-            log.warning(f"Update duration coroutine didn't stop within {i / 10} seconds")
-
         # Reset bot data
         self.client.setup()
 
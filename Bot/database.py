@@ -1,75 +1,325 @@
 '''
 Executes all mysql queries to database
-There are three kinds of tables:
-    queuelist table (contains all necessary details about the queue list)
+There are three tables:
+    queuelist table (persistent copy of the in-memory queue list, see queue_list.py)
+    queue_state table (contains the position of the current track in the queue list)
     playlists table (contains all downloaded playlist names)
-    playlist contents table (each table contains all necessary information of a single playlist)
+    playlist_tracks table (contains all necessary information of the songs of every playlist)
 '''
 import mysql.connector
 import logging
+import queue
+import threading
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 log = logging.getLogger(__name__)
 
+# Idle connections older than this many seconds are pinged before being reused
+IDLE_PING_SECONDS = 30
+
+# Distance between the queue_ids of neighbouring tracks after appending or compacting
+QUEUE_KEY_GAP = 1024
+
+# Frequently executed lookups, which are prepared once per connection
+# The driver only reuses a prepared statement if it is passed the very same string object,
+# hence prepared queries have to be module level constants like these
+QUEUELIST_QUERY = "SELECT id, queue_id, url, path, length, name, gain FROM queuelist ORDER BY queue_id"
+QUEUE_POSITION_QUERY = "SELECT position FROM queue_state WHERE id = 1"
+PLAYLIST_TRACKS_QUERY = " ".join(["SELECT playlist_tracks.url, playlist_tracks.path, playlist_tracks.length, playlist_tracks.gain",
+                                  "FROM playlist_tracks JOIN playlists ON playlists.id = playlist_tracks.playlist_id",
+                                  "WHERE playlists.name = %s ORDER BY playlist_tracks.position"])
+PLAYLIST_URLS_QUERY = " ".join(["SELECT playlist_tracks.url",
+                                "FROM playlist_tracks JOIN playlists ON playlists.id = playlist_tracks.playlist_id",
+                                "WHERE playlists.name = %s"])
+
+# Statements which write the queue list
+# They run within a transaction, executemany sends the upserted rows as a single multi-row insert
+UPSERT_QUEUE_QUERY = " ".join(["INSERT INTO queuelist (id, queue_id, url, path, length, name, gain)",
+                               "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                               "ON DUPLICATE KEY UPDATE queue_id = VALUES(queue_id), url = VALUES(url), path = VALUES(path),",
+                               "length = VALUES(length), name = VALUES(name), gain = VALUES(gain)"])
+COMPACT_QUEUE_QUERY = " ".join(["UPDATE queuelist JOIN (",
+                                "SELECT id, ROW_NUMBER() OVER (ORDER BY queue_id) AS position FROM queuelist",
+                                ") AS ordered ON queuelist.id = ordered.id",
+                                "SET queuelist.queue_id = ordered.position * %s"])
+UPSERT_QUEUE_POSITION_QUERY = " ".join(["INSERT INTO queue_state (id, position) VALUES (1, %s)",
+                                        "ON DUPLICATE KEY UPDATE position = VALUES(position)"])
+
 
 class Database:
     '''
     Connects to database, creates tables and performs queries
+    Keeps a pool of persistent connections, so that a query only costs a round-trip
     Parameters:
         username:   The username for the connection to the mysql database
         password:   The password for the connection to the mysql database
+        pool_size:  The maximum number of simultaneously open connections
     '''
-    def __init__(self, username, password) -> None:
+    def __init__(self, username, password, pool_size: int = 5) -> None:
         self.username = username
         self.password = password
+        self.pool_size = pool_size
+
+        # Container for idle connections and the time they were last used
+        self._idle = queue.LifoQueue()
+
+        # Limits the number of connections that are checked out at the same time
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+        # Prepared statement cursors of every connection
+        # Maps each connection to its server side id and a dict of query strings and cursors
+        self._statements = dict()
 
-    def execute(self, query) -> list:
+    def connect(self) -> mysql.connector.MySQLConnection:
         '''
-        Starts a connection to database, executes query and returns the result
+        Opens a new connection to the database
         '''
 
+        log.debug("Connecting to database")
+        return mysql.connector.connect(host='localhost',
+                                       database='discordbot',
+                                       user=self.username,
+                                       password=self.password)
+
+    def checkout(self, fresh: bool = False) -> mysql.connector.MySQLConnection:
+        '''
+        Takes a healthy connection from the pool or opens a new one if none is idle
+        If fresh is True, a new connection is opened regardless
+        Blocks while pool_size connections are in use
+        '''
+
+        self._slots.acquire()
+
         try:
+            if fresh:
+                return self.connect()
 
-            # Connect to databae
-            log.debug("Connecting to database")
-            connection = mysql.connector.connect(host='localhost',
-                                                 database='discordbot',
-                                                 user=self.username,
-                                                 password=self.password)
+            while True:
 
-            log.info(f"Executing query: '{query}'")
+                # Open a new connection if there are no idle ones
+                try:
+                    connection, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self.connect()
 
-            # Create cursor
-            cursor = connection.cursor()
+                # Reuse recently used connections without checking them
+                if time.monotonic() - last_used < IDLE_PING_SECONDS:
+                    return connection
 
-            # Execute query
-            cursor.execute(query)
+                # Check whether the connection is still alive and reconnect if not
+                try:
+                    connection.ping(reconnect=True, attempts=2, delay=0)
+                    return connection
 
-            # Fetch results
-            result = cursor.fetchall()
+                except mysql.connector.Error as e:
+                    log.warning("Discarding broken connection: " + str(e))
+                    self.discard(connection)
 
-            # Commit
-            connection.commit()
+        except Exception:
+            self._slots.release()
+            raise
 
-            log.info("Query was successfully executed. Result: " + str(result))
+    def checkin(self, connection: mysql.connector.MySQLConnection, broken: bool = False) -> None:
+        '''
+        Returns a connection to the pool, broken connections are closed instead
+        Whether a connection is broken is known from the outcome of its last query,
+        checking it here would cost another round-trip
+        '''
+
+        try:
+            if broken:
+                log.warning("Discarding broken connection")
+                self.discard(connection)
+            else:
+                self._idle.put((connection, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def discard(self, connection: mysql.connector.MySQLConnection) -> None:
+        '''
+        Closes a connection without returning it to the pool
+        '''
+
+        self.forget_statements(connection)
 
+        try:
+            connection.close()
         except Exception as e:
+            log.debug("Couldn't close connection: " + str(e))
 
-            result = None
-            log.error("Connection to db failed. Error: " + str(e))
+    @contextmanager
+    def connection(self, fresh: bool = False):
+        '''
+        Checks out a connection for the duration of a with block, see checkout
+        The connection is discarded if the block raises a connection error
+        '''
+
+        connection = self.checkout(fresh)
+        broken = False
+        try:
+            yield connection
+
+        # The connection to the server was lost
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            broken = True
+            raise
 
         finally:
+            self.checkin(connection, broken)
+
+    @contextmanager
+    def transaction(self):
+        '''
+        Yields a cursor for the duration of a with block
+        All statements executed with it are committed together or not at all
+        '''
 
-            # Close connection to database
-            if connection.is_connected():
-                log.debug("Closing connection")
+        with self.connection() as connection:
+
+            cursor = connection.cursor()
+
+            try:
+                yield cursor
+                connection.commit()
+
+            except Exception:
+                connection.rollback()
+                raise
+
+            finally:
                 cursor.close()
-                connection.close()
 
+    def close(self) -> None:
+        '''
+        Closes all idle connections
+        '''
+
+        log.info("Closing all idle database connections")
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(connection)
+
+    def get_prepared_cursor(self, connection: mysql.connector.MySQLConnection, query: str):
+        '''
+        Returns the cursor which holds the prepared statement of query on connection
+        and prepares it if it doesn't exist yet
+        '''
+
+        # Prepared statements are lost, if the connection was reestablished
+        connection_id, statements = self._statements.get(connection, (None, None))
+        if connection_id != connection.connection_id:
+            statements = dict()
+            self._statements[connection] = (connection.connection_id, statements)
+
+        # The statement is prepared on the first execution of the cursor
+        if query not in statements:
+            log.debug(f"Preparing statement: '{query}'")
+            statements[query] = connection.cursor(prepared=True)
+
+        return statements[query]
+
+    def forget_statements(self, connection: mysql.connector.MySQLConnection) -> None:
+        '''
+        Closes all prepared statement cursors of a connection
+        '''
+
+        _, statements = self._statements.pop(connection, (None, dict()))
+        for cursor in statements.values():
+            try:
+                cursor.close()
+            except Exception as e:
+                log.debug("Couldn't close prepared statement: " + str(e))
+
+    def execute(self, query: str, params: tuple = None, prepared: bool = False) -> list:
+        '''
+        Executes query on a pooled connection and returns the result
+        Values in params are sent separately from the query, which has
+        to contain a %s placeholder for each of them
+        If prepared is True, the statement is parsed only once per connection,
+        which requires query to be a module level constant
+        A connection which broke since its last use is only noticed by its next query,
+        so a query which fails with a connection error is repeated once on a fresh connection
+        '''
+
+        for attempt in range(2):
+            try:
+                result = self.run_query(query, params, prepared, fresh=attempt > 0)
+
+            except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError) as e:
+                if attempt == 0:
+                    log.warning("Lost connection to db, retrying. Error: " + str(e))
+                    continue
+
+                log.error("Connection to db failed. Error: " + str(e))
+                return None
+
+            except Exception as e:
+                log.error("Connection to db failed. Error: " + str(e))
+                return None
+
+            log.info("Query was successfully executed. Result: " + str(result))
             return result
 
+    def run_query(self, query: str, params: tuple, prepared: bool, fresh: bool = False) -> list:
+        '''
+        Executes query on a pooled connection and returns the result, errors are raised
+        See execute
+        '''
+
+        with self.connection(fresh) as connection:
+
+            log.info(f"Executing query: '{query}', parameters: {params}")
+
+            # Create cursor
+            if prepared:
+                cursor = self.get_prepared_cursor(connection, query)
+            else:
+                cursor = connection.cursor()
+
+            try:
+
+                # Execute query
+                if prepared:
+                    cursor.execute(query, params or ())
+                else:
+                    cursor.execute(query, params)
+
+                # Fetch results
+                result = cursor.fetchall() if cursor.with_rows else []
+
+                # Commit
+                connection.commit()
+
+            except Exception:
+
+                # Leave no open transaction or broken statement on a pooled connection
+                if prepared:
+                    self.forget_statements(connection)
+
+                # Rolling back fails on a lost connection, the original error is raised instead
+                try:
+                    connection.rollback()
+                except mysql.connector.Error as e:
+                    log.debug("Couldn't roll back. Error: " + str(e))
+                raise
+
+            finally:
+                if not prepared:
+                    cursor.close()
+
+        return result
+
     def setup(self) -> None:
         '''
-        Creates or resets the necessary tables in database
+        Creates the necessary tables in database
+        The contents of the queuelist table are kept, so that the queue survives restarts
         '''
 
         # Create queuelist table
@@ -93,137 +343,368 @@ class Database:
                           ")  ENGINE=INNODB;"])
         self.execute(query)
 
-        # Delete all entries from queuelist table
-        query = "DELETE FROM queuelist;"
-        self.execute(query)
+        # Bring tables up to date
+        self.migrate()
+
+        log.info("Database setup complete")
 
-        # Reset primary key
-        query = "ALTER TABLE queuelist AUTO_INCREMENT = 1;"
+    def get_schema_version(self) -> int:
+        '''
+        Gets and returns the version of the database schema, 0 if it was never migrated
+        '''
+
+        # Create schema version table
+        query = " ".join(["CREATE TABLE IF NOT EXISTS schema_version (",
+                          "version INT NOT NULL,",
+                          "PRIMARY KEY (version)",
+                          ")  ENGINE=INNODB;"])
         self.execute(query)
 
-        log.info("Database setup complete")
+        result = self.execute("SELECT MAX(version) FROM schema_version;")
+
+        return (result[0][0] if result else 0) or 0
 
-    def add_to_queue(self, queue_id: int, url: str, path: str, length: float, name: str) -> None:
+    def migrate(self) -> None:
         '''
-        Executes the process of adding a track to the queuelist
-        Queue_id specifies the order in which the songs are played
+        Runs all schema migrations which haven't been applied yet in their order
+        Raises the error of a failed migration, since the bot can't work with an outdated schema
+        Note that mysql commits schema changes implicitly, so a failed migration may be applied partially
         '''
 
-        # Remove all forbidden chars
-        path = path.replace("'", "''")
-        name = name.replace("'", "''")
+        # All migrations, the position in this list is the version they migrate to
+        migrations = [self.add_indexes, self.normalize_playlists, self.add_gain, self.add_queue_state]
 
-        # Insert into queue
-        query = f"INSERT INTO queuelist (queue_id, url, path, length, name) VALUES ({queue_id} ,'{url}', '{path}', {length}, '{name}');"
-        self.execute(query)
+        version = self.get_schema_version()
+
+        for number, migration in enumerate(migrations, start=1):
+
+            # Skip applied migrations
+            if number <= version:
+                continue
 
-        log.info(f"{queue_id}/{url}/{path}/{length}/{name} added to queuelist")
+            log.info(f"Migrating database schema to version {number}: {migration.__name__}")
 
-    def move_entries(self, index: int) -> None:
+            try:
+                with self.transaction() as cursor:
+                    migration(cursor)
+                    cursor.execute("INSERT INTO schema_version (version) VALUES (%s);", (number,))
 
+            except Exception as e:
+                log.critical(f"Migration to version {number} failed. Error: " + str(e))
+                raise
+
+    def get_playlist_tables(self, cursor) -> list:
         '''
-        Increases position in queue list of all entries
-        that have a position equal or higher than index by one
+        Gets and returns the names of all playlists whose table exists
         '''
 
-        log.info(f"Moving all entries that are equal or bigger than {index}")
+        cursor.execute(" ".join(["SELECT name FROM playlists WHERE name IN (",
+                                 "SELECT table_name FROM information_schema.tables",
+                                 "WHERE table_schema = DATABASE());"]))
 
-        self.execute(" ".join(["UPDATE queuelist",
-                               "SET queue_id = queue_id + 1",
-                               f"WHERE queue_id >= {index};"]))
+        return list(e[0] for e in cursor.fetchall())
 
-    def insert_into_queue(self, index: int, url: str, length: float, path: str, name: str) -> None:
+    def add_indexes(self, cursor) -> None:
         '''
-        Determines where to add a track into the queue list and
-        passes the paramters to the add_to_queue method
+        Migration 1: Indexes the columns of all hot lookups
+        The queue_id index isn't unique, since upserts move rows to queue_ids other rows still hold
         '''
 
-        # Add track at end of queue list if position not specified
-        if not index:
-            query = "SELECT MAX(queue_id) FROM queuelist;"
-            result = self.execute(query)[0][0]
-            if result:
-                index = 1 + result
-            else:
-                index = 1
+        cursor.execute("ALTER TABLE queuelist ADD INDEX queue_id (queue_id);")
+        cursor.execute("ALTER TABLE playlists ADD INDEX name (name);")
 
-        self.add_to_queue(index, url, path, length, name)
+        # Index the urls of all playlists, so that updates can compare them quickly
+        for name in self.get_playlist_tables(cursor):
+            cursor.execute(f"ALTER TABLE `{name}` ADD INDEX url (url);")
 
-    def get_max_queue_id(self) -> int:
+    def normalize_playlists(self, cursor) -> None:
         '''
-        Gets and returns index of last track in queue
+        Migration 2: Moves the songs of all playlists from their own tables into the playlist_tracks table
         '''
 
-        log.debug("Getting maximum queue_id")
+        # Create playlist tracks table
+        # The position index isn't unique, so that songs can be added to a playlist concurrently
+        cursor.execute(" ".join(["CREATE TABLE IF NOT EXISTS playlist_tracks (",
+                                 "id INT AUTO_INCREMENT,",
+                                 "playlist_id INT NOT NULL,",
+                                 "position INT NOT NULL,",
+                                 "url VARCHAR(255) NOT NULL,",
+                                 "path VARCHAR(255),",
+                                 "length FLOAT,",
+                                 "PRIMARY KEY (id),",
+                                 "INDEX playlist_position (playlist_id, position),",
+                                 "INDEX playlist_url (playlist_id, url),",
+                                 "FOREIGN KEY (playlist_id) REFERENCES playlists (id) ON DELETE CASCADE",
+                                 ")  ENGINE=INNODB;"]))
+
+        # Copy the songs of every playlist table and drop it
+        for name in self.get_playlist_tables(cursor):
+            cursor.execute(" ".join(["INSERT INTO playlist_tracks (playlist_id, position, url, path, length)",
+                                     "SELECT (SELECT MIN(id) FROM playlists WHERE name = %s),",
+                                     "ROW_NUMBER() OVER (ORDER BY id), url, path, length",
+                                     f"FROM `{name}`;"]), (name,))
+            cursor.execute(f"DROP TABLE `{name}`;")
+
+    def add_gain(self, cursor) -> None:
+        '''
+        Migration 3: Stores the gain which is applied to a downloaded track during playback
+        Existing tracks get a gain of 0, since their files have already been normalized
+        '''
 
-        query = "SELECT MAX(queue_id) FROM queuelist;"
-        index = self.execute(query)[0][0]
+        cursor.execute("ALTER TABLE queuelist ADD COLUMN gain FLOAT NOT NULL DEFAULT 0;")
+        cursor.execute("ALTER TABLE playlist_tracks ADD COLUMN gain FLOAT NOT NULL DEFAULT 0;")
 
-        if not index:
-            index = 0
+    def add_queue_state(self, cursor) -> None:
+        '''
+        Migration 4: Stores the position of the current track, so that the queue list resumes from it after a restart
+        The table contains a single row with id 1
+        '''
 
-        log.info("Maximum queue_id: " + str(index))
-        return index
+        cursor.execute(" ".join(["CREATE TABLE IF NOT EXISTS queue_state (",
+                                 "id INT NOT NULL,",
+                                 "position INT NOT NULL,",
+                                 "PRIMARY KEY (id)",
+                                 ")  ENGINE=INNODB;"]))
 
-    def create_playlist_table(self, name: str, url: str) -> None:
+    def create_playlist(self, name: str, url: str) -> None:
         '''
-        Creates a table containing the data of all songs of a playlist
+        Adds a playlist to the playlists table
         '''
 
-        # Create table
-        query = " ".join([f"CREATE TABLE IF NOT EXISTS `{name}` (",
-                          "id INT AUTO_INCREMENT,",
-                          "url VARCHAR(255) NOT NULL,",
-                          "path VARCHAR(255),",
-                          "length FLOAT,",
-                          "PRIMARY KEY (id)",
-                          ")  ENGINE=INNODB;"])
-        self.execute(query)
+        query = "INSERT INTO playlists (name, url) VALUES (%s, %s)"
+        self.execute(query, (name, url))
 
-        # Insert playlist name into playlists table
-        query = f"INSERT INTO playlists (name, url) VALUES ('{name}', '{url}')"
-        self.execute(query)
+    def insert_into_playlist(self, name: str, url: str, path: str, length: float, gain: float = 0) -> None:
+        '''
+        Adds a track at the end of a playlist
+        Gain is the volume change in dB which is applied during playback
+        '''
+
+        query = " ".join(["INSERT INTO playlist_tracks (playlist_id, position, url, path, length, gain)",
+                          "SELECT id, (SELECT COALESCE(MAX(position), 0) + 1 FROM playlist_tracks WHERE playlist_id = playlists.id),",
+                          "%s, %s, %s, %s FROM playlists WHERE name = %s LIMIT 1;"])
+        self.execute(query, (url, path, length, gain, name))
 
-    def insert_into_playlist(self, name: str, url: str, path: str, length: float) -> None:
+    def get_playlist_names(self) -> list:
         '''
-        Inserts a track into its playlist's table
+        Gets and returns the names of all playlists
         '''
-        # Remove all forbidden chars
-        path = path.replace("'", "''")
 
-        # Insert track
-        query = f"INSERT INTO `{name}` (url, path, length) VALUES ('{url}', '{path}', {length});"
-        self.execute(query)
+        result = self.execute("SELECT name FROM playlists ORDER BY name;") or []
+
+        return list(e[0] for e in result)
+
+    def get_playlist_url(self, name: str) -> str:
+        '''
+        Gets and returns the url a playlist was created from
+        Returns None if there is no such playlist
+        '''
+
+        result = self.execute("SELECT url FROM playlists WHERE name = %s;", (name,))
+
+        if result:
+            return result[0][0]
+
+    def get_playlist_tracks(self, name: str) -> list:
+        '''
+        Gets and returns url, path, length and gain of all songs of a playlist in their order
+        '''
+
+        return self.execute(PLAYLIST_TRACKS_QUERY, (name,), prepared=True) or []
+
+    def get_playlist_urls(self, name: str) -> set:
+        '''
+        Gets and returns the urls of all songs of a playlist
+        '''
+
+        return set(e[0] for e in self.execute(PLAYLIST_URLS_QUERY, (name,), prepared=True) or [])
+
+    def delete_playlist(self, name: str) -> None:
+        '''
+        Deletes a playlist, its songs are deleted along with it
+        '''
+
+        self.execute("DELETE FROM playlists WHERE name = %s;", (name,))
 
     def reset_queuelist_ids(self) -> None:
         '''
-        Closes gaps in queue list
+        Evens out the gaps in queue list with a single statement,
+        afterwards the queue_id of every track is its position times QUEUE_KEY_GAP
         '''
 
         log.info("Closing gaps in queuelist")
 
-        # Get queue list contents
-        query = "SELECT id FROM queuelist ORDER BY queue_id"
-        queuelist = self.execute(query)
+        self.execute(COMPACT_QUEUE_QUERY, (QUEUE_KEY_GAP,))
+
+    def get_queuelist(self) -> list:
+        '''
+        Gets and returns id, queue_id, url, path, length, name and gain of all tracks in queue list in their order
+        '''
+
+        log.debug("Loading queuelist")
+
+        return self.execute(QUEUELIST_QUERY, prepared=True)
+
+    def get_queue_position(self) -> int:
+        '''
+        Gets and returns the position of the current track in the queue list, 1 if it was never stored
+        '''
+
+        result = self.execute(QUEUE_POSITION_QUERY, prepared=True)
 
-        # Close gaps in queuelist by giving ordered queue_id indieces
-        for i, song in enumerate(queuelist, start=1):
-            query = f"UPDATE queuelist SET queue_id={i} WHERE id={song[0]}"
-        # TODO Test when many songs in queue
+        return result[0][0] if result else 1
 
-    def get_current_url(self, counter) -> str:
+    def persist_queue(self, rows: list, cleared: bool = False, removed: list = [], position: int = None) -> bool:
         '''
-        Gets and returns url of current track
+        Writes a batch of queue list changes within a single transaction
+        Each row is a tuple containing id, queue_id, url, path, length, name and gain
+        and is either inserted or, if the id exists already, overwritten with the new values
+        If cleared is True, all previous entries are deleted first
+        Removed contains the ids of deleted tracks, the gaps they leave are closed afterwards
+        Position is the new position of the current track, None if it hasn't changed
+        Returns whether the changes were written
         '''
 
-        log.debug("Getting current url")
+        log.info(f"Writing {len(rows)} queuelist entries, cleared: {cleared}, removed: {len(removed)}, position: {position}")
 
         try:
-            query = f"SELECT url FROM queuelist WHERE queue_id = {counter}"
-            url = self.execute(query)[0][0]
 
-            log.info(f"Current url: {url}")
-            return url
+            with self.transaction() as cursor:
+
+                # Delete all previous entries
+                if cleared:
+                    cursor.execute("DELETE FROM queuelist;")
+
+                # Delete removed entries
+                if removed:
+                    placeholders = ", ".join(["%s"] * len(removed))
+                    cursor.execute(f"DELETE FROM queuelist WHERE id IN ({placeholders});", tuple(removed))
+
+                # Insert or move all changed entries
+                if rows:
+                    cursor.executemany(UPSERT_QUEUE_QUERY, rows)
+
+                # Close the gaps left by removed entries
+                if removed:
+                    cursor.execute(COMPACT_QUEUE_QUERY, (QUEUE_KEY_GAP,))
+
+                # Store position of the current track
+                if position is not None:
+                    cursor.execute(UPSERT_QUEUE_POSITION_QUERY, (position,))
+
+            return True
+
+        except Exception as e:
+            log.error("Couldn't write queuelist changes. Error: " + str(e))
+            return False
+
+
+class AsyncDatabase:
+    '''
+    Awaitable counterpart of the Database class for use in coroutines
+    Every call runs in a dedicated thread pool, so that waiting for
+    mysql never blocks the event loop
+    Parameters:
+        db: The Database object which performs the queries
+    '''
+    def __init__(self, db: Database) -> None:
+        self.db = db
+
+        # One worker per pooled connection
+        self.executor = ThreadPoolExecutor(max_workers=db.pool_size,
+                                           thread_name_prefix="database")
+
+    async def run(self, function, *args, **kwargs):
+        '''
+        Runs a blocking function in the database thread pool and returns its result
+        '''
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    async def close(self) -> None:
+        '''
+        Stops the thread pool once all running queries are finished and closes all idle connections
+        '''
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.executor.shutdown)
+        await loop.run_in_executor(None, self.db.close)
+
+    async def execute(self, query: str, params: tuple = None, prepared: bool = False) -> list:
+        '''
+        See Database.execute
+        '''
+        return await self.run(self.db.execute, query, params, prepared)
+
+    async def setup(self) -> None:
+        '''
+        See Database.setup
+        '''
+        return await self.run(self.db.setup)
+
+    async def create_playlist(self, name: str, url: str) -> None:
+        '''
+        See Database.create_playlist
+        '''
+        return await self.run(self.db.create_playlist, name, url)
+
+    async def insert_into_playlist(self, name: str, url: str, path: str, length: float, gain: float = 0) -> None:
+        '''
+        See Database.insert_into_playlist
+        '''
+        return await self.run(self.db.insert_into_playlist, name, url, path, length, gain)
+
+    async def get_playlist_names(self) -> list:
+        '''
+        See Database.get_playlist_names
+        '''
+        return await self.run(self.db.get_playlist_names)
+
+    async def get_playlist_url(self, name: str) -> str:
+        '''
+        See Database.get_playlist_url
+        '''
+        return await self.run(self.db.get_playlist_url, name)
+
+    async def get_playlist_tracks(self, name: str) -> list:
+        '''
+        See Database.get_playlist_tracks
+        '''
+        return await self.run(self.db.get_playlist_tracks, name)
+
+    async def get_playlist_urls(self, name: str) -> set:
+        '''
+        See Database.get_playlist_urls
+        '''
+        return await self.run(self.db.get_playlist_urls, name)
+
+    async def delete_playlist(self, name: str) -> None:
+        '''
+        See Database.delete_playlist
+        '''
+        return await self.run(self.db.delete_playlist, name)
+
+    async def reset_queuelist_ids(self) -> None:
+        '''
+        See Database.reset_queuelist_ids
+        '''
+        return await self.run(self.db.reset_queuelist_ids)
+
+    async def get_queuelist(self) -> list:
+        '''
+        See Database.get_queuelist
+        '''
+        return await self.run(self.db.get_queuelist)
+
+    async def get_queue_position(self) -> int:
+        '''
+        See Database.get_queue_position
+        '''
+        return await self.run(self.db.get_queue_position)
 
-        except IndexError:
-            log.error("No currrent track")
+    async def persist_queue(self, rows: list, cleared: bool = False, removed: list = [], position: int = None) -> bool:
+        '''
+        See Database.persist_queue
+        '''
+        return await self.run(self.db.persist_queue, rows, cleared, removed, position)
@@ -1,107 +1,256 @@
 '''
 Performs all download processes
 '''
-import logging, subprocess, os, functools
+import logging, subprocess, os, functools, re, shutil, tempfile
 import pafy
 import youtube_dl
-from pydub import AudioSegment
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from ytdl_source import extraction_cache
+from audio_cache import AudioCache
+from converter import convert_url
+from env_vars import EnvVariables
 
 log = logging.getLogger(__name__)
 
+# Persistent cache of all downloaded tracks, survives restarts and directory resets
+audio_cache = AudioCache("audio_cache", EnvVariables().AUDIO_CACHE_SIZE * 1024 * 1024)
 
-def download_audio_manually(url: str) -> None:
+# Mean volume all tracks are adjusted to, in dBFS
+TARGET_LOUDNESS = -40
+
+# Number of additional attempts to download a playlist track
+DOWNLOAD_RETRIES = 2
+
+# Runs the loudness analysis, one ffmpeg process per cpu at most,
+# so that analysing doesn't hold up the downloads in the default executor
+analysis_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+
+def download_audio_manually(url: str, info: dict = None, directory: str = "temp") -> None:
     '''
-    Download audio via youtube-dl
+    Download audio via youtube-dl into directory
+    Info can be passed if the video data has already been extracted
     '''
 
     log.info("Downloading audio via youtube-dl")
 
     # Set youtube-dl settings
+    # The stream is kept as downloaded, re-encoding it would only lose quality
     ydl_opts = {
         'format': 'bestaudio/best',
-        'outtmpl': "./temp/%(title)s.%(ext)s",
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'm4a',
-            'preferredquality': '192'
-        }]
+        'outtmpl': directory + "/%(title)s.%(ext)s",
     }
 
     # Download audio
     with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+        if info:
+            ydl.process_ie_result(info, download=True)
+        else:
+            ydl.download([url])
 
 
-def normalizeAudio(audiopath: str, destination_path: str) -> int:
+def measure_loudness(audiopath: str) -> tuple:
     '''
-    Changes the volume of the track to a uniform one
-    Returns the length of the track in seconds
+    Measures the mean volume of a track in dBFS with ffmpeg's volumedetect filter
+    The track is decoded as a stream, so memory usage doesn't depend on its length
+    Returns the mean volume and the length of the track in seconds
     '''
-    log.info(f"Normalizing {audiopath}")
 
-    # Read file with pydub
-    song = AudioSegment.from_file(audiopath)
+    result = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-nostats", "-nostdin", "-i", audiopath, "-vn", "-af", "volumedetect", "-f", "null", "-"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True
+    )
+    output = result.stderr.decode(errors="replace")
+
+    # Get mean volume and duration from ffmpeg's output, silent tracks are left as they are
+    match = re.search(r"mean_volume: (-?[\d.]+) dB", output)
+    mean_volume = float(match.group(1)) if match else TARGET_LOUDNESS
+    duration = re.search(r"Duration: (\d+):(\d+):([\d.]+)", output)
+    length = int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3)) if duration else 0
+
+    return mean_volume, length
 
-    # Normalize sound
-    loudness = song.dBFS
-    quieterAudio = 40 + loudness
-    song = song - quieterAudio
 
-    # Export song to new path
-    song.export(destination_path, 'webm')
+def analyse_audio(audiopath: str, destination_path: str) -> tuple:
+    '''
+    Computes the gain which brings the track to a uniform volume and moves it to destination path
+    The file itself stays untouched, the gain is applied during playback
+    Returns the length of the track in seconds and the gain in dB
+    '''
+    log.info(f"Analysing {audiopath}")
+
+    # Measure loudness
+    loudness, length = measure_loudness(audiopath)
+    gain = round(TARGET_LOUDNESS - loudness, 2)
 
-    # Remove old track
-    os.remove(audiopath)
+    # Move track to its destination
+    shutil.move(audiopath, destination_path)
 
-    log.info(f"Normalized {audiopath}")
+    log.info(f"Analysed {audiopath}, gain: {gain} dB")
 
-    # Return length of song
-    return int(song.duration_seconds)
+    return int(length), gain
 
 
 async def try_to_download(url: str, target: str) -> tuple:
     '''
-    Downloads and normalizes audio. Returns its path and length
+    Downloads audio and computes the gain which normalizes its volume during playback
+    Returns its path, length and gain
+    Tracks which have been downloaded before are taken from the audio cache instead
     '''
 
+    loop = asyncio.get_event_loop()
+
+    # Get video id, the key of the audio cache
+    try:
+        _id = convert_url(url, id_only=True)
+    except ValueError:
+        _id = None
+
+    # Try to restore track from audio cache
+    if _id:
+        try:
+            cached = await loop.run_in_executor(None, audio_cache.restore, _id, target)
+            if cached:
+                return cached
+        except Exception as e:
+            log.error("Couldn't restore track from audio cache. Error: " + str(e))
+
     # Download audio
     log.info("Starting download process")
 
-    # Get all files in temp directory
-    files = os.listdir("temp")
+    # Download into a directory of its own, so that concurrent downloads don't mix up their files
+    directory = tempfile.mkdtemp(dir="temp")
 
     try:
-        # Get video details with pafy
-        vid = pafy.new(url)
 
-        # Select best audio
-        bestaudio = vid.getbestaudio(preftype="webm")
+        try:
+            # Get video details with pafy
+            vid = pafy.new(url)
 
-        # Download video
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, functools.partial(bestaudio.download,
-                                                           filepath="temp\\",
-                                                           quiet=True))
+            # Select best audio
+            bestaudio = vid.getbestaudio(preftype="webm")
 
-    except Exception as e:
+            # Download video
+            await loop.run_in_executor(None, functools.partial(bestaudio.download,
+                                                               filepath=directory,
+                                                               quiet=True))
 
-        # Download audio via youtube-dl
-        log.error("Pafy failed downloading: " + str(e))
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, download_audio_manually, url)
+        except Exception as e:
 
-    # Get path of downloaded file by getting all files in test directory
-    # and removing all files that already were there
-    path = list(set(os.listdir("temp")).difference(set(files)))[0]
+            # Download audio via youtube-dl
+            log.error("Pafy failed downloading: " + str(e))
 
-    # Normalize volume of track, move it to the queue folder and get its length
-    loop = asyncio.get_event_loop()
-    length = await loop.run_in_executor(None, normalizeAudio, "temp\\" + path, target + "\\" + path)
+            # Reuse the extracted video data if possible
+            try:
+                info = await extraction_cache.get(url)
+            except Exception as e:
+                log.error("Couldn't extract video data: " + str(e))
+                info = None
+
+            await loop.run_in_executor(None, download_audio_manually, url, info, directory)
+
+        # Get path of downloaded file, the only file in the directory
+        path = os.listdir(directory)[0]
+
+        # Compute gain and length of track and move it to the target folder
+        length, gain = await loop.run_in_executor(analysis_executor, analyse_audio, os.path.join(directory, path), target + "\\" + path)
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    log.info("Finished downloading and analysing. Path: " + str(path))
+
+    # Add track to audio cache
+    if _id:
+        try:
+            await loop.run_in_executor(None, audio_cache.store, _id, target + "\\" + path, length, gain)
+        except Exception as e:
+            log.error("Couldn't add track to audio cache. Error: " + str(e))
+
+    return path, length, gain
+
+
+async def download_many(urls: list, target: str, on_done, on_progress=None, concurrency: int = 4, retries: int = DOWNLOAD_RETRIES) -> int:
+    '''
+    Downloads multiple tracks into target with concurrency workers,
+    so that downloads overlap with each other and with the analysis of finished ones
+    Each track is attempted retries more times if downloading fails
+    Parameters:
+        urls:        Youtube urls of the tracks
+        target:      Directory the tracks are downloaded to
+        on_done:     Coroutine function, awaited with url, path, length and gain of every downloaded track,
+                     in the order of urls
+        on_progress: Optional function, called with the number of finished tracks
+        concurrency: Maximum number of tracks downloaded at the same time
+        retries:     Number of additional attempts per track
+    Returns the number of tracks which couldn't be added
+    '''
+
+    log.info(f"Downloading {len(urls)} tracks with {concurrency} workers")
+
+    pending = asyncio.Queue()
+    for entry in enumerate(urls):
+        pending.put_nowait(entry)
+
+    # Downloaded tracks which wait for their predecessors, mapped by index
+    results = dict()
+
+    # Guarantees that on_done is awaited in order
+    lock = asyncio.Lock()
+
+    state = {"next": 0, "finished": 0, "failed": 0}
+
+    async def download(url: str) -> tuple:
+
+        for attempt in range(retries + 1):
+            try:
+                return await try_to_download(url, target)
+
+            except Exception as e:
+                log.warning(f"Attempt {attempt + 1} to download {url} failed. Error: " + str(e))
+
+                # Wait before retrying
+                if attempt < retries:
+                    await asyncio.sleep(2 ** attempt)
+
+        return None
+
+    async def worker() -> None:
+
+        while not pending.empty():
+            index, url = pending.get_nowait()
+
+            results[index] = await download(url)
+
+            async with lock:
+                state["finished"] += 1
+
+                # Hand out all tracks whose predecessors have been handed out
+                while state["next"] in results:
+                    result = results.pop(state["next"])
+                    url = urls[state["next"]]
+                    state["next"] += 1
+
+                    if not result:
+                        log.error(f"Couldn't download {url}")
+                        state["failed"] += 1
+                        continue
+
+                    try:
+                        await on_done(url, *result)
+                    except Exception as e:
+                        log.error(f"Couldn't add {url}. Error: " + str(e))
+                        state["failed"] += 1
+
+                if on_progress:
+                    on_progress(state["finished"])
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(urls))))))
 
-    log.info("Finished downloading and normalizing. Path: " + str(path))
+    log.info(f"Downloaded {len(urls) - state['failed']} of {len(urls)} tracks")
 
-    return path, length
+    return state["failed"]
 
 
 async def dl_captions(url: str, lang: str):
@@ -32,5 +32,14 @@ class EnvVariables():
         # MySql database password
         self.SQL_PW = os.getenv('MYSQL_PW')
 
+        # Maximum number of pooled MySql connections
+        self.SQL_POOL_SIZE = int(os.getenv('MYSQL_POOL_SIZE', 5))
+
+        # Size budget of the audio cache in megabytes
+        self.AUDIO_CACHE_SIZE = int(os.getenv('AUDIO_CACHE_SIZE', 2048))
+
+        # Number of playlist tracks downloaded at the same time
+        self.DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', 4))
+
         # Id of the role with admin permissions
         self.ADMIN_ROLE_ID = os.getenv('ADMIN_ROLE_ID')
@@ -0,0 +1,145 @@
+'''
+Contains the ExtractionCache class
+'''
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from converter import convert_url
+log = logging.getLogger(__name__)
+
+# Maximum number of cached videos
+CACHE_SIZE = 64
+
+# Seconds a result is kept if its stream urls don't specify an expiry
+DEFAULT_TTL = 3600
+
+# Seconds a result is discarded before its stream urls expire,
+# so that a stream doesn't expire right after it has been started
+EXPIRY_MARGIN = 300
+
+
+class ExtractionCache:
+    '''
+    Shared cache of youtube-dl extract_info results, keyed by video id
+    Results are kept until the googlevideo stream urls they contain expire,
+    the least recently used ones are evicted once the cache is full
+    Concurrent requests for the same video share a single extraction
+    Parameters:
+        extract: Blocking function which extracts the data of a url
+        size:    Maximum number of cached videos
+    '''
+
+    def __init__(self, extract, size: int = CACHE_SIZE) -> None:
+        self.extract = extract
+        self.size = size
+
+        # Deadlines (monotonic time) and data of the cached videos, least recently used first
+        self.entries = OrderedDict()
+
+        # Extractions in progress, mapped by video id
+        self.pending = dict()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(url: str) -> str:
+        '''
+        Returns the video id of url, or url itself if it has none
+        '''
+
+        try:
+            return convert_url(url, id_only=True)
+        except ValueError:
+            return url
+
+    @staticmethod
+    def get_deadline(data: dict) -> float:
+        '''
+        Returns the monotonic time until which data can be used
+        The earliest 'expire' parameter of its stream urls is taken into account
+        '''
+
+        now = time.time()
+        ttl = DEFAULT_TTL
+
+        # Collect stream urls of the selected formats
+        urls = [data.get('url')] + list(e.get('url') for e in data.get('requested_formats') or [])
+
+        for url in urls:
+            if not url:
+                continue
+
+            expire = parse_qs(urlparse(url).query).get('expire')
+            if expire and expire[0].isdigit():
+                ttl = min(ttl, int(expire[0]) - now - EXPIRY_MARGIN)
+
+        return time.monotonic() + ttl
+
+    async def get(self, url: str, loop: asyncio.AbstractEventLoop = None) -> dict:
+        '''
+        Returns the extracted data of url, extracts it if it isn't cached or expired
+        '''
+
+        key = self.get_key(url)
+
+        # Return cached data if still valid
+        entry = self.entries.get(key)
+        if entry:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            log.info(f"Extraction of {key} expired")
+            del self.entries[key]
+
+        # Join extraction in progress
+        if key in self.pending:
+            self.hits += 1
+            return await asyncio.shield(self.pending[key])
+
+        self.misses += 1
+
+        # Extract data, the result is stored even if the requester stops waiting for it
+        loop = loop or asyncio.get_event_loop()
+        future = loop.run_in_executor(None, self.extract, url)
+        self.pending[key] = future
+        future.add_done_callback(lambda f: self.finish(key, f))
+
+        return await asyncio.shield(future)
+
+    def finish(self, key: str, future: asyncio.Future) -> None:
+        '''
+        Stores the result of a finished extraction
+        '''
+
+        self.pending.pop(key, None)
+
+        if not future.cancelled() and not future.exception():
+            self.put(key, future.result())
+
+    def put(self, key: str, data: dict) -> None:
+        '''
+        Stores data and evicts the least recently used entries if the cache is full
+        '''
+
+        deadline = self.get_deadline(data)
+        if deadline <= time.monotonic():
+            return
+
+        self.entries[key] = (deadline, data)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, url: str) -> None:
+        '''
+        Discards the cached data of url, e.g. after its stream couldn't be played
+        '''
+
+        self.entries.pop(self.get_key(url), None)
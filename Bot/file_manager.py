@@ -21,6 +21,7 @@ def delete_directory(direc: str) -> None:
 def reset_directories() -> None:
     '''
     Deletes all contents in queue, temp and captions directories
+    The audio cache directory is kept, so downloaded tracks survive restarts
     '''
 
     # Reset queue directory
@@ -80,29 +81,3 @@ def create_playlist_directory(name: str) -> str:
     # Error detection
     log.error("Invalid playlist name")
     raise ValueError
-
-
-def get_playlists():
-    '''
-    Get all playlists in 'playlists' folder
-    '''
-
-    log.info("Getting playlist directories")
-
-    # Create container for the playlists
-    playlists = []
-
-    # Check if playlists directory exists
-    if os.path.exists("playlists"):
-
-        # Loop thorugh all files in playlists
-        folders = os.listdir("playlists")
-        for folder in folders:
-
-            # Check if file is a directory
-            if os.path.isdir("playlists\\" + folder):
-
-                # Add playlist to container
-                playlists.append(folder)
-
-    return playlists
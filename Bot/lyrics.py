@@ -7,7 +7,7 @@ from my_client import MyClient
 from discord_slash.context import SlashContext
 from lrc_kit import ComboLyricsProvider, SearchRequest
 from youtube import YouTube
-import youtube_dl
+from ytdl_source import extraction_cache
 import logging
 import functools
 import asyncio
@@ -203,17 +203,8 @@ async def get_song_data(_id: str) -> tuple:
     Attempts to get song author and title
     '''
 
-    # Set youtube-dl settings
-    ydl = youtube_dl.YoutubeDL({})
-
-    with ydl:
-
-        # Extract youtube video details with youtube-dl
-        loop = asyncio.get_event_loop()
-        dl_function = functools.partial(ydl.extract_info,
-                                        "https://www.youtube.com/watch?v=" + _id,
-                                        download=False)
-        info = await loop.run_in_executor(None, dl_function)
+    # Extract youtube video details with youtube-dl, shares the extraction with the player
+    info = await extraction_cache.get("https://www.youtube.com/watch?v=" + _id)
 
     try:
 
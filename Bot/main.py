@@ -12,13 +12,13 @@ import hide
 from env_vars import EnvVariables
 
 # Database connection
-from database import Database
+from database import Database, AsyncDatabase
 
 # File manager
 import file_manager
 
 # Music downloader
-from downloader import try_to_download
+from downloader import try_to_download, download_many, audio_cache
 
 # Converter
 from converter import convert_time, convert_url, get_name_from_path
@@ -81,7 +81,7 @@ def check_index(index: int) -> int:
     '''
 
     # Check if index is higher than index of last song in queue
-    if index > db.get_max_queue_id() - client.queue_counter:
+    if index > len(client.queue) - client.queue_counter:
 
         log.info("Index too high!")
         return 0
@@ -89,14 +89,14 @@ def check_index(index: int) -> int:
     return index
 
 
-def check_playlist_name(name: str) -> bool:
+async def check_playlist_name(name: str) -> bool:
     '''
-    Determines whether given name value is an existing playlist directory
+    Determines whether given name value is an existing playlist
     and returns the corresponding boolean
     '''
 
-    # Check if any playlist directory matches given value
-    if any(name == e for e in file_manager.get_playlists()):
+    # Check if any playlist matches given value
+    if name in await adb.get_playlist_names():
         return True
 
     log.info("Passed not existing playlist name: " + str(name))
@@ -219,39 +219,42 @@ async def add_to_queue(url: str, index: int = 0, file_data: Union[bool, dict] =
 
         # Get missing file data
         path = ''
-        if not length:
-            _id = convert_url(url, id_only=True)
+        gain = 0
+        _id = convert_url(url, id_only=True)
+
+        # Tracks in the audio cache are played from disk and their length is known
+        cached = audio_cache.get(_id)
+        if cached:
+            length = cached["length"]
+
+        elif not length:
             length = await yt.get_length(_id)
 
         assert length
 
-        # Check if video qualifies for download: dl parameter must be true and 
+        # Check if video qualifies for download: it must be cached or dl parameter must be true and 
         # total video length may not exceed 90 seconds
-        if dl and length < 60 * 1.5:
+        if cached or (dl and length < 60 * 1.5):
 
             # Download video and set path
-            path, length = await try_to_download(url, 'queue')
-            path = r'queue\\' + path
+            path, length, gain = await try_to_download(url, 'queue')
+            path = 'queue\\' + path
 
     else:
 
         # Get data from previously downloaded file
         path = file_data["path"]
         length = file_data["length"]
+        gain = file_data.get("gain", 0)
 
     # Set index to zero if below zero
     if index < 0:
         index = 0
 
-    # Move all entries higher or equal to index
+    # Convert index to position in queue
     if index:
-
-        # Convert index to position in queue
         index += client.queue_counter
 
-        # Move entries
-        db.move_entries(index)
-
     # Try to get the name from file path
     name = get_name_from_path(path)
 
@@ -263,7 +266,8 @@ async def add_to_queue(url: str, index: int = 0, file_data: Union[bool, dict] =
 
     # Insert song data into queue
     log.info(f"Inserting into queue {index}, {url}, {length}, {path}, {name}")
-    db.insert_into_queue(index, url, length, path, name)
+    client.queue.insert(index, [(url, path, length, name, gain)])
+    client.prefetch_next()
 
     # Start player if no song is playing
     if client.waiting:
@@ -276,6 +280,67 @@ async def add_to_queue(url: str, index: int = 0, file_data: Union[bool, dict] =
     return name
 
 
+async def add_many_to_queue(urls: list, index: int = 0, file_data: list = None, lengths: list = None) -> int:
+    '''
+    Collects the data of multiple songs and adds them to the queuelist at once
+    Parameters:
+        urls: youtube urls of the songs
+        index: position of the first song in queuelist
+        file_data: Data of the files, if songs were downloaded previously (In playlists)
+        lengths: Lengths of the songs, if they weren't downloaded
+    Returns the number of added songs
+    '''
+
+    log.info(f"Adding {len(urls)} songs to queuelist")
+
+    tracks = []
+    for i, url in enumerate(urls):
+
+        # Get data from previously downloaded file
+        if file_data:
+            path = file_data[i]["path"]
+            length = file_data[i]["length"]
+            gain = file_data[i].get("gain", 0)
+
+        # Otherwise the song will be streamed
+        else:
+            path = ''
+            length = lengths[i]
+            gain = 0
+
+        # Try to get the name from file path
+        tracks.append([url, path, length, get_name_from_path(path), gain])
+
+    # Get all missing names via youtube data api, 50 at a time
+    missing = list(convert_url(e[0], id_only=True) for e in tracks if not e[3])
+    if missing:
+        names = await yt.get_names(missing)
+        for track in tracks:
+            if not track[3]:
+                track[3] = names.get(convert_url(track[0], id_only=True), track[0])
+
+    # Set index to zero if below zero
+    if index < 0:
+        index = 0
+
+    # Convert index to position in queue
+    if index:
+        index += client.queue_counter
+
+    # Insert all songs into queue
+    client.queue.insert(index, list(tuple(e) for e in tracks))
+    client.prefetch_next()
+
+    # Start player if no song is playing
+    if client.waiting:
+
+        client.waiting = False
+
+        client.start_player()
+
+    return len(tracks)
+
+
 async def play_audio(ctx: SlashContext, url: str, index: int) -> None:
     '''
     Checks if url and index are valid and calls add_to_queuelist afterwards.
@@ -454,13 +519,12 @@ async def _playlist(ctx: SlashContext, url: str = None, name: str = None, index:
     if name:
 
         # Check if playlist exists
-        if not check_playlist_name(name):
+        if not await check_playlist_name(name):
             await ctx.send("This playlist does not exist")
             return
 
         # Get playlist details
-        query = f"SELECT url, path, length FROM {name}"
-        playlist_songs = db.execute(query)
+        playlist_songs = await adb.get_playlist_tracks(name)
 
         # Shuffle list if desired
         if randomize:
@@ -475,20 +539,12 @@ async def _playlist(ctx: SlashContext, url: str = None, name: str = None, index:
         # If index is too high, set to 0
         # This cause the songs to be added the end of the queue
         index = check_index(index)
-        for song in playlist_songs:
-            
-            # Put song data into a dictionary
-            song_data = {
-                "path": song[1].replace("\\", "\\\\"),
-                "length": song[2]
-            }
 
-            # Add song to queue
-            await add_to_queue(song[0], index=index, file_data=song_data)
+        # Put song data into dictionaries
+        songs_data = list({"path": song[1], "length": song[2], "gain": song[3]} for song in playlist_songs)
 
-            # Increase index by one if active
-            if index:
-                index += 1
+        # Add all songs to queue
+        await add_many_to_queue(list(song[0] for song in playlist_songs), index=index, file_data=songs_data)
 
         # Update queue list message
         await client.update_queuelist_messages()
@@ -541,24 +597,14 @@ async def _playlist(ctx: SlashContext, url: str = None, name: str = None, index:
         # Convert ids to urls
         urls = list('https://www.youtube.com/watch?v=' + e for e in _ids)
 
-        for i, song_url in enumerate(urls):
-
-            try:
-                # Add song to queue
-                await add_to_queue(song_url, index=index, length=lengths[i])
-
-                # Start player if music player not active
-                if client.waiting:
-                    client.start_player()
-                    client.waiting = False
+        try:
 
-                # Increase index if given
-                if index:
-                    index += 1
+            # Add all songs to queue
+            await add_many_to_queue(urls, index=index, lengths=lengths)
 
-            except Exception as e:
+        except Exception as e:
 
-                log.error(f"Couldn't add {song_url} to playlist: " + str(e))
+            log.error(f"Couldn't add {url} to queue: " + str(e))
 
         # Update queue list messages
         await client.update_queuelist_messages()
@@ -621,11 +667,13 @@ async def _control(ctx: SlashContext):
 
     # Add message to control board message list
     client.control_board_messages.append(msg)
+    client.wake_progress()
 
     # Delete old control board messages that exceed max amount
     # Current max amount is 1
     while len(client.control_board_messages) > 1:
         old_msg = client.control_board_messages.pop(0)
+        client.editor.forget(old_msg)
         try:
             await old_msg.delete()
         except:
@@ -694,9 +742,8 @@ async def _queue(ctx: SlashContext, amount: int = 10):
 
     await ctx.defer()
 
-    # Get the queue list database entries
-    query = f"SELECT name, length FROM queuelist WHERE queue_id >= {client.queue_counter} ORDER BY queue_id"
-    queuelist = db.execute(query)
+    # Get the visible queue list entries
+    queuelist = client.get_queue_page(amount)
 
     # Check if queue list is empty
     if len(queuelist) < 1:
@@ -722,11 +769,7 @@ async def _queue(ctx: SlashContext, amount: int = 10):
     while len(client.queuelist_messages) > 1:
         log.info("Deleting old queuelist message")
         old_messages = client.queuelist_messages.pop(0)
-        for msg in old_messages[0]:
-            try:
-                await msg.delete()
-            except:
-                log.error("Failed to delete old queue list message")
+        await client.delete_messages(old_messages[0])
 
 
 @slash.slash(name="quit")
@@ -741,12 +784,17 @@ async def _quit(ctx: SlashContext):
     
     await ctx.defer()
 
-    # Cancel update duration loop
-    client.update_duration.cancel()
+    # Cancel progress scheduler
+    client.progress_task.cancel()
 
     # Disconnect from voice channel, reset queuelist table and delete files
     await control_board.stop(ctx, silent=True)
 
+    # Stop background writes, write remaining queue list changes and close all pooled database connections
+    await client.queue.stop()
+    await client.queue.flush()
+    await adb.close()
+
     # Set status to offline
     await client.change_presence(status=discord.Status.offline)
 
@@ -796,16 +844,16 @@ async def _create_playlist(ctx: SlashContext, url: str, name: str) -> None:
             await ctx.send("This playlist already exists")
             return
 
-        # Create database table
+        # Add playlist to database
         try:
-            db.create_playlist_table(name, url)
+            await adb.create_playlist(name, url)
         
         except Exception as e:
-            log.info("Couldn't create table: " + str(e))
+            log.info("Couldn't add playlist to database: " + str(e))
             raise Exception
         
         # Add choice to slash command
-        slashcommands.update_playlist_commands()
+        slashcommands.update_playlist_commands(await adb.get_playlist_names())
 
         # Get urls of videos in playlist
         url_list = await yt.get_playlist_contents(_id)
@@ -816,36 +864,27 @@ async def _create_playlist(ctx: SlashContext, url: str, name: str) -> None:
         # Create message which indicates download progress
         playlist_msg = await ctx.send(string_creator.create_playlist_download_string("Downloading contents", 0, url_list))
 
-        # Download contents
-        for i, url in enumerate(url_list):
-            try:
-                await client.lock.acquire()
+        async def add_track(url: str, path: str, length: int, gain: float) -> None:
 
-                # Update progress
-                try:
-                    cont = string_creator.create_playlist_download_string("Downloading contents", i, url_list)
-                    await playlist_msg.edit(content=cont)
-                except Exception as e:
-                    log.warning("Couldn't update message: " + str(e))
-                
-                # Download audio
-                path, length = await try_to_download(url, "playlists\\" + name)
+            # Change path to queue directory
+            path = "playlists\\" + name + "\\" + path
 
-                # Change path to queue directory
-                path = r"playlists\\" + name + r"\\" + path
+            # Insert audio data into playlist
+            await adb.insert_into_playlist(name, url, path, int(length), gain)
 
-                # Insert audio data into playlist database table
-                db.insert_into_playlist(name, url, path, int(length))
+            log.info(f"{path} added to {name} playlist")
 
-                log.info(f"{path} added to {name} playlist")
-            
-            except Exception as e:
-                log.error(f"Couldn't add {url} to playlist. Error: " + str(e))
-            
-            finally:
-                client.lock.release()
+        def update_progress(finished: int) -> None:
+            cont = string_creator.create_playlist_download_string("Downloading contents", finished, url_list)
+            client.editor.edit(playlist_msg, cont, content=cont)
+
+        # Download contents, one playlist at a time
+        async with client.lock:
+            failed = await download_many(url_list, "playlists\\" + name, add_track, update_progress,
+                                         concurrency=env_var.DOWNLOAD_CONCURRENCY)
 
-        await playlist_msg.edit(content="Finished creating playlist")
+        client.editor.forget(playlist_msg)
+        await playlist_msg.edit(content=string_creator.create_playlist_finished_string("Finished creating playlist", failed))
 
         # Start player
         client.start_player(force=True)
@@ -854,8 +893,8 @@ async def _create_playlist(ctx: SlashContext, url: str, name: str) -> None:
 
         # Revert changes
         file_manager.delete_directory("playlists\\" + name)
-        db.execute("DROP TABLE " + name)
-        slashcommands.update_playlist_commands()
+        await adb.delete_playlist(name)
+        slashcommands.update_playlist_commands(await adb.get_playlist_names())
 
         log.error("Couldn't create playlist. Error: " + str(e))
 
@@ -875,7 +914,7 @@ async def _update_playlist(ctx: SlashContext, name: str, url: str = "") -> None:
         return
 
     # Check if playlist exists
-    if not check_playlist_name(name):
+    if not await check_playlist_name(name):
         await ctx.send("Unknown playlist name")
         return
 
@@ -886,9 +925,8 @@ async def _update_playlist(ctx: SlashContext, name: str, url: str = "") -> None:
     if not url:
 
         # Try to get original playlist url
-        try:
-            url = db.execute(f"SELECT url FROM playlists WHERE name = '{name}'")[0][0]
-        except (IndexError, TypeError):
+        url = await adb.get_playlist_url(name)
+        if not url:
             log.error("Couldn't find playlist url")
             await ctx.send("An error occurred")
             return
@@ -906,8 +944,7 @@ async def _update_playlist(ctx: SlashContext, name: str, url: str = "") -> None:
         new_urls = set(await yt.get_playlist_contents(_id))
 
     # Get all playlist urls
-    old_urls = db.execute(f"SELECT url FROM `{name}`")
-    old_urls = set(e[0] for e in old_urls)
+    old_urls = await adb.get_playlist_urls(name)
 
     # Determine the urls that are not yet downloaded
     urls_to_download = list(new_urls.difference(old_urls))
@@ -915,32 +952,27 @@ async def _update_playlist(ctx: SlashContext, name: str, url: str = "") -> None:
     # Send messages which indicates download progress
     msg = await ctx.send(string_creator.create_playlist_download_string("Updating contents", 0, urls_to_download))
 
-    # Download songs
-    for i, url_to_download in enumerate(urls_to_download):
-        try:
-            await client.lock.acquire()
-
-            # Edit download progress
-            await msg.edit(content=string_creator.create_playlist_download_string("Updating contents", i, urls_to_download))
+    async def add_track(url: str, path: str, length: int, gain: float) -> None:
 
-            # Download song
-            path, length = await try_to_download(url_to_download, "playlists\\" + name)
+        # Change path to queue directory
+        path = "playlists\\" + name + "\\" + path
 
-            # Change path to queue directory
-            path = r"playlists\\" + name + r"\\" + path
+        # Insert song data into playlist
+        await adb.insert_into_playlist(name, url, path, int(length), gain)
 
-            # Insert song data into playlist database table
-            db.insert_into_playlist(name, url, path, int(length))
+        log.info(f"{path} added to {name} playlist")
 
-            log.info(f"{path} added to {name} playlist")
+    def update_progress(finished: int) -> None:
+        cont = string_creator.create_playlist_download_string("Updating contents", finished, urls_to_download)
+        client.editor.edit(msg, cont, content=cont)
 
-        except Exception as e:
-            log.error(f"Couldn't add {url} to playlist. Error: " + str(e))
+    # Download songs, one playlist at a time
+    async with client.lock:
+        failed = await download_many(urls_to_download, "playlists\\" + name, add_track, update_progress,
+                                     concurrency=env_var.DOWNLOAD_CONCURRENCY)
 
-        finally:
-            client.lock.release()
-        
-    await msg.edit(content="Finished updating playlist")
+    client.editor.forget(msg)
+    await msg.edit(content=string_creator.create_playlist_finished_string("Finished updating playlist", failed))
     client.start_player(force=True)
 
 
@@ -957,12 +989,12 @@ async def _delete_playlist(ctx: SlashContext, name: str) -> None:
         return
     
     # Check if playlist exists
-    if not check_playlist_name(name):
+    if not await check_playlist_name(name):
 
         await ctx.send("Unknown playlist!")
 
         # Update playlist command in case slash command options are outdated
-        slashcommands.update_playlist_commands()
+        slashcommands.update_playlist_commands(await adb.get_playlist_names())
         return
 
     # Stop player by force
@@ -971,15 +1003,20 @@ async def _delete_playlist(ctx: SlashContext, name: str) -> None:
     # Delete playlist files
     file_manager.delete_directory("playlists\\" + name)
 
-    # Update slash commands
-    slashcommands.update_playlist_commands()
+    # Remove the playlist's songs from queue list, the gaps they leave
+    # are closed when the changes are written to the database
+    directory = "playlists\\" + name + "\\"
+    positions = client.queue.remove(lambda track: track.path.startswith(directory))
 
-    # Close gaps in queue list
-    db.reset_queuelist_ids()
+    # Keep the queue counter on the same song
+    client.queue_counter = max(1, client.queue_counter - sum(1 for e in positions if e < client.queue_counter))
+    client.prefetch_next()
 
-    # Delete database table and entries
-    db.execute(f"DROP TABLE {name}")
-    db.execute(f"DELETE FROM playlists WHERE name = {name}")
+    # Delete playlist and its songs from database
+    await adb.delete_playlist(name)
+
+    # Update slash commands
+    slashcommands.update_playlist_commands(await adb.get_playlist_names())
 
     # Start music player again
     client.start_player(force=True)
@@ -1016,26 +1053,19 @@ async def _repeat(ctx: SlashContext, amount: int = -1) -> None:
 
 
 @slash.slash(name="shuffle")
-async def _shuffle(ctx: SlashContext) -> None:
+async def _shuffle(ctx: SlashContext, seed: int = None) -> None:
     '''
     Shuffles queue list
+    The same seed always results in the same order
     '''
 
     log.info("Shuffling playlist")
 
     await ctx.defer()
 
-    # Get all next tracks
-    query = f"SELECT id FROM queuelist WHERE queue_id > {client.queue_counter}"
-    queuelist = db.execute(query)
-
-    # Shuffle queue
-    random.shuffle(queuelist)
-
-    # Assign videos to their new position
-    for i, entry in enumerate(queuelist):
-        query = f"UPDATE queuelist SET queue_id = {i + client.queue_counter} WHERE id = {entry[0]}"
-        db.execute(query)
+    # Shuffle all next tracks
+    client.queue.shuffle(client.queue_counter + 1, seed=seed)
+    client.prefetch_next()
     
     # Update queue list messages
     await client.update_queuelist_messages()
@@ -1052,13 +1082,15 @@ async def _lyrics(ctx: SlashContext, full=False):
     await ctx.defer()
 
     # Get the url of the current video
-    url = db.get_current_url(client.queue_counter)
+    track = client.queue.get(client.queue_counter)
 
     # Return if not playing anything
-    if not url:
+    if not track:
         await ctx.send("No song playing!")
         return
 
+    url = track.url
+
     # Extract video id
     _id = convert_url(url, id_only=True)
 
@@ -1119,11 +1151,13 @@ async def _lyrics(ctx: SlashContext, full=False):
 
             # Add message to lyrics message list
             client.lyrics_messages.append(msg)
+            client.wake_progress()
 
             # Delete all old messages that exceed max amount
             # Current max amount is 1
             while len(client.lyrics_messages) > 1:
                 old_msg = client.lyrics_messages.pop(0)
+                client.editor.forget(old_msg)
                 try:
                     await old_msg.delete()
                 except:
@@ -1140,6 +1174,11 @@ async def on_ready() -> None:
     # Delete all tracks from previous uses
     file_manager.reset_directories()
 
+    # Restore the queue list of the previous session once
+    if not client.queue.writer:
+        await client.queue.load()
+        client.queue.start()
+
     # Set admin role
     client.admin_role_id = env_var.ADMIN_ROLE_ID
 
@@ -1178,10 +1217,12 @@ async def on_component(ctx: ComponentContext):
     # between the played song and its lyrics
     if ctx.custom_id == "reduce_lyrics_timer":
         client.lyrics_timer -= 1
+        client.wake_progress()
         await ctx.send("Decreased", delete_after=1.5)
 
     elif ctx.custom_id == "increase_lyrics_timer":
         client.lyrics_timer += 1
+        client.wake_progress()
         await ctx.send("Increased", delete_after=1.5)
 
     # Check whether to show full lyrics
@@ -1207,9 +1248,12 @@ async def on_component(ctx: ComponentContext):
 if __name__ == "__main__":
 
     # Create DataBase class instance
-    db = Database(env_var.SQL_USER, env_var.SQL_PW)
+    db = Database(env_var.SQL_USER, env_var.SQL_PW, pool_size=env_var.SQL_POOL_SIZE)
     db.setup()
 
+    # Create awaitable database interface for the coroutines
+    adb = AsyncDatabase(db)
+
     # Create YouTube class instance
     yt = YouTube(env_var.DEVELOPER_KEY)
 
@@ -1217,7 +1261,7 @@ if __name__ == "__main__":
     genius = lyricsgenius.Genius(env_var.GENIUS_TOKEN)
 
     # Create control board commands manager
-    control_board = control.ControlBoard(client, db)
+    control_board = control.ControlBoard(client, adb)
 
     # Create performance checker
     perf_check = PerfCheck()
@@ -1226,7 +1270,7 @@ if __name__ == "__main__":
     console_visibility = hide.console
 
     # Store database in client class
-    client.set_db(db)
+    client.set_db(adb)
 
     # Run Discord Bot
     client.run(env_var.TOKEN)
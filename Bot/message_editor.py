@@ -0,0 +1,153 @@
+'''
+Contains the MessageEditor class
+'''
+import asyncio
+import logging
+import time
+from collections import deque
+import discord
+log = logging.getLogger(__name__)
+
+# Number of edits sent per channel within EDIT_PERIOD seconds
+# Discord allows five messages per five seconds and channel, one is left for command replies
+EDIT_RATE = 4
+EDIT_PERIOD = 5.0
+
+
+class MessageEditor:
+    '''
+    Central scheduler for the edits of live messages (control boards, queue lists and lyrics)
+    Only the latest desired content of a message is kept, intermediate states which
+    haven't been sent yet are merged into it. Edits are sent by one worker per channel,
+    which stays within the rate limit of the channel
+    Parameters:
+        on_missing: Optional callback, which gets called with messages that don't exist anymore
+        rate:       Number of edits sent per channel within period seconds
+        period:     Length of the rate limit window in seconds
+    '''
+
+    def __init__(self, on_missing=None, rate: int = EDIT_RATE, period: float = EDIT_PERIOD) -> None:
+        self.on_missing = on_missing
+        self.rate = rate
+        self.period = period
+
+        # Latest desired edit of each message, mapped by message id
+        self.pending = dict()
+
+        # Key of the content last sent to each message, mapped by message id
+        self.sent_keys = dict()
+
+        # Ids of the messages with pending edits in the order they were requested, mapped by channel id
+        self.queues = dict()
+
+        # Times of the last edits sent, mapped by channel id
+        self.history = dict()
+
+        # Worker task of each channel with pending edits, mapped by channel id
+        self.workers = dict()
+
+        # Statistics
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+
+    def edit(self, msg, key, **kwargs) -> None:
+        '''
+        Requests msg to be edited with kwargs
+        Key identifies the content, edits with the key the message already displays are dropped
+        '''
+
+        # Replace the pending edit, its content won't be sent anymore
+        if msg.id in self.pending:
+            self.pending[msg.id] = (msg, key, kwargs)
+            self.merged += 1
+            return
+
+        # Drop edit if message is up to date
+        if self.sent_keys.get(msg.id) == key:
+            self.dropped += 1
+            return
+
+        self.pending[msg.id] = (msg, key, kwargs)
+
+        # Queue message and start worker of channel if necessary
+        channel_id = msg.channel.id
+        self.queues.setdefault(channel_id, deque()).append(msg.id)
+        if channel_id not in self.workers:
+            self.workers[channel_id] = asyncio.ensure_future(self.work(channel_id))
+
+    def forget(self, msg) -> None:
+        '''
+        Discards the pending edit and the sent content of msg, e.g. before deleting it
+        '''
+
+        if self.pending.pop(msg.id, None):
+            self.dropped += 1
+        self.sent_keys.pop(msg.id, None)
+
+    async def work(self, channel_id: int) -> None:
+        '''
+        Sends the pending edits of a channel, as fast as its rate limit allows
+        '''
+
+        queue = self.queues[channel_id]
+        history = self.history.setdefault(channel_id, deque(maxlen=self.rate))
+
+        try:
+            while queue:
+
+                # Skip messages which have been forgotten
+                _id = queue.popleft()
+                if _id not in self.pending:
+                    continue
+
+                # Wait until the oldest edit of the window has expired
+                if len(history) == self.rate:
+                    delay = history[0] + self.period - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+
+                # Take the latest content, which might have changed while waiting
+                entry = self.pending.pop(_id, None)
+                if not entry:
+                    continue
+                msg, key, kwargs = entry
+
+                history.append(time.monotonic())
+
+                try:
+                    await msg.edit(**kwargs)
+                    self.sent_keys[_id] = key
+                    self.sent += 1
+
+                except discord.errors.NotFound:
+                    log.warning("Could not edit message, it was not found")
+                    self.dropped += 1
+                    self.sent_keys.pop(_id, None)
+                    if self.on_missing:
+                        self.on_missing(msg)
+
+                except Exception as e:
+                    log.error("Couldn't edit message. Error: " + str(e))
+
+        finally:
+            self.workers.pop(channel_id, None)
+
+    def report(self) -> None:
+        '''
+        Logs the number of sent, merged and dropped edits
+        '''
+
+        log.info(f"Message edits sent: {self.sent}, merged: {self.merged}, dropped: {self.dropped}")
+
+    def close(self) -> None:
+        '''
+        Cancels all pending edits
+        '''
+
+        for worker in list(self.workers.values()):
+            worker.cancel()
+
+        self.dropped += len(self.pending)
+        self.pending = dict()
+        self.report()
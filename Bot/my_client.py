@@ -6,16 +6,30 @@ import discord
 from discord.ext import commands
 import asyncio
 import logging
-import datetime
 from discord_slash.model import SlashMessage
 import string_creator
 from discord.ext import tasks
-from ytdl_source import YTDLSource
-from converter import convert_url
-import time, math
+from ytdl_source import YTDLSource, extraction_cache
+from converter import convert_url, format_time_ffmpeg
+from queue_list import QueueList
+from playback_clock import PlaybackClock
+from message_editor import MessageEditor
+from prefetcher import Prefetcher
+import time
 from discord_slash import manage_components, ButtonStyle
 log = logging.getLogger(__name__)
 
+# Maximum number of messages deleted at the same time
+DELETE_CONCURRENCY = 5
+
+# Seconds the replaced source of a seek is kept alive,
+# the player thread might still be reading a frame from it
+SOURCE_CLEANUP_DELAY = 0.5
+
+# Gains in dB which are too small to be heard are not applied,
+# so that the opus audio of these tracks can be passed through without transcoding
+GAIN_TOLERANCE = 1.0
+
 
 class MyClient(commands.Bot):
     '''
@@ -36,12 +50,6 @@ class MyClient(commands.Bot):
         # Create instance of PerfCheck (for debugging purposes)
         self.perf = PerfCheck()
 
-        # Container for current datetime
-        self.now = datetime.datetime.now()
-
-        # Create counter for current track index
-        self.queue_counter = 1
-
         # Indicates if all requested songs have been played
         self.waiting = True
 
@@ -54,8 +62,8 @@ class MyClient(commands.Bot):
         # Container for all emojis
         self.custom_emojis = dict()
 
-        # Indicates how long a song has been played
-        self.song_timer = 0
+        # Position at which the track restarted with the boption settings begins
+        self.boption_position = 0
 
         # Current status
         self.current_status = None
@@ -67,6 +75,22 @@ class MyClient(commands.Bot):
         # Containter for all messages containing control boards
         self.control_board_messages = []
 
+        # The render key and embed of the last rendered control board
+        self.control_board_render = (None, None)
+
+        # Codec and bitrate of all probed files, mapped by path
+        self.codecs = dict()
+
+        # Resolves the stream urls of the next tracks in advance
+        if getattr(self, "prefetcher", None):
+            self.prefetcher.clear()
+        self.prefetcher = Prefetcher(self.loop)
+
+        # Sends the edits of all control board, queue list and lyrics messages
+        if getattr(self, "editor", None):
+            self.editor.close()
+        self.editor = MessageEditor(on_missing=self.forget_message)
+
         # Container for all messages containing the queuelist
         self.queuelist_messages = []
 
@@ -76,7 +100,8 @@ class MyClient(commands.Bot):
         # Indicates the current line of lyrics
         self.current_lyrics_index = 0
 
-        # The name and duration of the current track
+        # The current track record, its name and duration
+        self.current_track = None
         self.current_track_name = None
         self.current_track_duration = 0
         self.current_thumbnail = None
@@ -124,9 +149,47 @@ class MyClient(commands.Bot):
         # Balances the time difference between the song and its lyrics
         self.lyrics_timer = 0
 
-        # Start update duration loop
-        self.update_duration.cancel()
-        self.update_duration.start()
+        # Is set whenever the progress displays have to be rendered immediately
+        self.progress_event = asyncio.Event()
+
+        # Indicates how long the current song has been played
+        self.clock = PlaybackClock(on_change=self.wake_progress)
+
+        # Start progress scheduler
+        if getattr(self, "progress_task", None):
+            self.progress_task.cancel()
+        self.progress_task = self.loop.create_task(self.progress_loop())
+
+    def wake_progress(self) -> None:
+        '''
+        Makes the progress scheduler render all progress displays and compute its next wake up
+        '''
+
+        self.progress_event.set()
+
+    def pause(self) -> None:
+        '''
+        Pauses player and song timer
+        '''
+
+        self.vc.pause()
+        self.clock.pause()
+
+    def resume(self) -> None:
+        '''
+        Resumes player and song timer
+        '''
+
+        self.vc.resume()
+        self.clock.play()
+
+    def prefetch_next(self) -> None:
+        '''
+        Lets the prefetcher resolve the tracks following the current one
+        Has to be called whenever the upcoming tracks change
+        '''
+
+        self.prefetcher.update(self.queue.window(self.queue_counter + 1, self.prefetcher.depth))
 
     def vc_check(self) -> bool:
         '''
@@ -134,9 +197,10 @@ class MyClient(commands.Bot):
         '''
         return self.vc and (self.vc.is_paused() or self.vc.is_playing())
     
-    def play_with_boption(self, boption: str) -> None:
+    def play_with_boption(self, boption: str, position: float = 0) -> None:
         '''
         Resets the current track with the boption settings
+        Position specifies where the track begins with these settings, e.g. after seeking
         '''
 
         # Check if playing music currently
@@ -147,6 +211,7 @@ class MyClient(commands.Bot):
 
             # Assign boptions to self
             self.boption = boption
+            self.boption_position = position
 
             # Restart player
             self.vc.stop()
@@ -155,6 +220,99 @@ class MyClient(commands.Bot):
         else:
             return False
 
+    @staticmethod
+    def get_ffmpeg_options(track) -> str:
+        '''
+        Returns the ffmpeg options which apply the gain of a downloaded track
+        Returns None if the track doesn't need any gain
+        '''
+
+        if abs(track.gain) < GAIN_TOLERANCE:
+            return None
+
+        return f"-af volume={track.gain:.2f}dB"
+
+    async def create_file_source(self, track, before_options: str = None) -> discord.FFmpegOpusAudio:
+        '''
+        Creates the audio source of a downloaded track
+        Opus files which don't need any gain are passed through without transcoding,
+        all other files are transcoded with their gain applied
+        Discord plays the opus packets as they are, so a gain can't be applied without transcoding
+        '''
+
+        options = self.get_ffmpeg_options(track)
+
+        if not options:
+
+            # Probe codec once per file
+            if track.path not in self.codecs:
+                try:
+                    self.codecs[track.path] = await discord.FFmpegOpusAudio.probe(track.path)
+                except Exception as e:
+                    log.error("Couldn't probe codec. Error: " + str(e))
+                    self.codecs[track.path] = (None, None)
+
+            codec, bitrate = self.codecs[track.path]
+
+            # Only demux opus audio, passing the opus codec makes ffmpeg copy the stream
+            if codec == "opus":
+                log.info("Passing opus audio through")
+                return discord.FFmpegOpusAudio(track.path, before_options=before_options, codec=codec, bitrate=bitrate or 128)
+
+        return discord.FFmpegOpusAudio(track.path, before_options=before_options, options=options)
+
+    async def seek(self, position: float) -> bool:
+        '''
+        Continues the current track at position by swapping the source of the player
+        Reuses the current track record and the extracted stream data, the player keeps running,
+        so the song_done and check_player round trip is skipped
+        Returns False if not playing audio
+        '''
+
+        # Check if playing music currently
+        if not self.vc_check() or not self.current_track:
+            return False
+
+        track = self.current_track
+        boption = "-nostdin -ss {}".format(format_time_ffmpeg(int(position)))
+
+        log.info(f"Seeking to {position}")
+
+        try:
+
+            # Create source starting at position
+            if track.path == '':
+                source = await YTDLSource.from_url(track.url, loop=self.loop, before_options=boption, stream=True)
+            else:
+                source = await self.create_file_source(track, before_options=boption)
+
+        except Exception as e:
+
+            # Restart the track with the boption settings instead
+            log.error("Couldn't create source for seeking. Error: " + str(e))
+            return self.play_with_boption(boption, position=position)
+
+        # Check whether the track has changed or ended in the meantime
+        if not self.vc_check() or self.current_track is not track:
+            source.cleanup()
+            return False
+
+        # Swap sources, setting the source resumes the player
+        paused = self.vc.is_paused()
+        old_source = self.vc.source
+        self.vc.source = source
+
+        # Kill the old ffmpeg process once the player has moved on to the new source,
+        # an empty read from it would end the track
+        self.loop.call_later(SOURCE_CLEANUP_DELAY, old_source.cleanup)
+
+        if paused:
+            self.vc.pause()
+
+        self.clock.seek(position)
+
+        return True
+
     def start_player(self, force: bool = False) -> None:
 
         '''
@@ -192,20 +350,40 @@ class MyClient(commands.Bot):
         Resets data about current song
         '''
 
+        self.current_track = None
         self.current_track_name = None
         self.current_track_duration = 0
         self.current_thumbnail = None
     
+    @property
+    def queue_counter(self) -> int:
+        '''
+        Position of the current track in the queue list, which is persisted along with it
+        '''
+        return self.queue.position
+
+    @queue_counter.setter
+    def queue_counter(self, position: int) -> None:
+        self.queue.move_to(position)
+
     def set_db(self, db) -> None:
         '''
-        Stores a Database object
+        Stores an AsyncDatabase object and creates the queue list which is persisted in it
         '''
         self.db = db
+        self.queue = QueueList(db)
     
     def song_done(self, error: Exception) -> None:
         '''
-        Callback function which gets called after a song has ended
-        Prints errors if present and starts the next track
+        Callback function which gets called by the player thread after a song has ended
+        Hands over to the event loop, since queue counter and player must only be changed from there
+        '''
+
+        self.loop.call_soon_threadsafe(self.finish_song, error)
+
+    def finish_song(self, error: Exception) -> None:
+        '''
+        Prints errors if present, advances the queue counter and starts the next track
         '''
 
         # Check if player currently disabled
@@ -313,23 +491,14 @@ class MyClient(commands.Bot):
 
         log.info("Updating queuelists")
 
-        # Get current and all next songs
-        query = f"SELECT name, length FROM queuelist WHERE queue_id >= {self.queue_counter} ORDER BY queue_id"
-        queuelist = self.db.execute(query)
-
         # Delete all messages if there are no more songs
-        if len(queuelist) < 1:
+        if not self.queue.get(self.queue_counter):
 
             log.info("No more songs, deleting all queuelist messages")
-            for messages in self.queuelist_messages:
-
-                for message in messages[0]:
-                    if message in messages:
-                        messages.remove(message)
-                    try:
-                        await message.delete()
-                    except discord.errors.NotFound:
-                        log.warning("Couldn't delete queue list message")
+            for messages, _ in self.queuelist_messages:
+                old_messages = list(messages)
+                messages.clear()
+                await self.delete_messages(old_messages)
 
             return
 
@@ -338,8 +507,8 @@ class MyClient(commands.Bot):
 
             log.info(f"Updating queuelist message of length {amount}")
 
-            # Create queue list message string
-            new_messages = string_creator.create_queue_string(queuelist, amount)
+            # Create queue list message string from the visible tracks only
+            new_messages = string_creator.create_queue_string(self.get_queue_page(amount), amount)
 
             # Loop through all messages of queue list chain
             for i in range(len(messages)):
@@ -347,22 +516,45 @@ class MyClient(commands.Bot):
                 try:
                     
                     # Update message
-                    await messages[i].edit(content=new_messages[i])
+                    self.editor.edit(messages[i], new_messages[i], content=new_messages[i])
 
                 except IndexError:
                     
                     # Delete this and all following messages in queue list chain
-                    for j in range(i, len(messages)):
-                        await messages[j].delete()
-                    messages = messages[:i]
-                    log.warning(f"Deleted {j-i} queuelist messages")
+                    surplus = messages[i:]
+                    del messages[i:]
+                    await self.delete_messages(surplus)
+                    log.warning(f"Deleted {len(surplus)} queuelist messages")
                     break
-                
+    
+    def get_queue_page(self, amount: int) -> list:
+        '''
+        Returns the current track and the amount following ones
+        Returns all following tracks if amount is negative
+        '''
+
+        return self.queue.window(self.queue_counter, amount + 1 if amount >= 0 else None)
+
+    async def delete_messages(self, messages: list) -> None:
+        '''
+        Deletes messages concurrently, at most DELETE_CONCURRENCY at the same time
+        A message which couldn't be deleted doesn't affect the others
+        '''
+
+        semaphore = asyncio.Semaphore(DELETE_CONCURRENCY)
+
+        async def delete(msg) -> None:
+            self.editor.forget(msg)
+            async with semaphore:
+                try:
+                    await msg.delete()
                 except discord.errors.NotFound:
+                    log.warning("Couldn't delete message, it was not found")
+                except Exception as e:
+                    log.error("Couldn't delete message. Error: " + str(e))
+
+        await asyncio.gather(*(delete(msg) for msg in messages))
 
-                    log.warning("Could not update queuelist message, it was not found")
-                    messages.remove(messages[i])
-    
     async def delete_queuelist_messages(self) -> None:
         '''
         Deletes all messages displaying the queue list
@@ -373,46 +565,58 @@ class MyClient(commands.Bot):
 
         log.info("Deleting all queuelist messages")
 
-        # Delete all messages
-        for message_list in self.queuelist_messages:
-
-            # Delete all messages in queue list chain
-            for msg in message_list[0]:
-                try:
-                    await msg.delete()
-                except Exception as e:
-                    log.error("Couldn't delete control board message. Error: " + str(e))
-    
+        # Delete all messages of all queue list chains
+        messages = list(msg for message_list in self.queuelist_messages for msg in message_list[0])
         self.queuelist_messages = []
+        await self.delete_messages(messages)
     
     async def delete_control_board_messages(self) -> None:
         '''
         Deletes all messages containing the control board messages
         '''
 
-        for message in self.control_board_messages:
-            try:
-                await message.delete()
-            except Exception as e:
-                log.error("Couldn't delete control board message " + str(e))
-        
+        messages = self.control_board_messages
         self.control_board_messages = []
+        await self.delete_messages(messages)
     
     async def delete_lyrics_messages(self) -> None:
         '''
         Deletes all messages containing the control board messages
         '''
 
-        for message in self.lyrics_messages:
-            try:
-                await message.delete()
-            except Exception as e:
-                log.error("Couldn't delete lyrics message " + str(e))
-        
+        messages = self.lyrics_messages
         self.lyrics_messages = []
+        await self.delete_messages(messages)
+
         self.current_lyrics = []
         self.current_lyrics_index = 0
     
+    def render_control_board(self) -> tuple:
+        '''
+        Returns the render key and embed of the current control board
+        The embed is only created if the key, consisting of track, number of filled
+        progress bar cells and paused state, differs from the last rendered one
+        '''
+
+        filled = string_creator.get_progress_bar_cells(self.current_track_name, int(self.clock.position), self.current_track_duration)
+        paused = bool(self.vc and self.vc.is_paused())
+        key = (self.current_track_name, int(self.current_track_duration), self.current_thumbnail, filled, paused)
+
+        # Reuse last embed if nothing changed
+        if self.control_board_render[0] == key:
+            return self.control_board_render
+
+        embed = string_creator.create_control_board_message_embed(
+            name=self.current_track_name,
+            filled=filled,
+            track_duration=int(self.current_track_duration),
+            url=self.current_thumbnail,
+            paused=paused
+        )
+        self.control_board_render = (key, embed)
+
+        return self.control_board_render
+
     async def update_control_board_messages(self):
         '''
         Updates all messages displaying the control board
@@ -420,48 +624,38 @@ class MyClient(commands.Bot):
         a progress bar and 6 buttons for controlling the player
         '''
 
-        # Create string
-        new_embed = string_creator.create_control_board_message_embed(
-            name=self.current_track_name,
-            song_timer=int(self.song_timer),
-            track_duration=int(self.current_track_duration),
-            url=self.current_thumbnail
-        )
+        key, embed = self.render_control_board()
 
-        # Update all messages
+        # Request edits, messages which already display the control board are skipped by the editor
         for msg in self.control_board_messages:
-            
-            # Get content of old message
-            old_fields = msg.embeds[0].fields
-            
-            # Get content of new message
-            new_fields = new_embed.fields
+            self.editor.edit(msg, key, embed=embed)
 
-            # Check if message needs to be updated
-            if len(old_fields) != len(new_fields) or not all(old_fields[e].value == new_fields[e].value for e in range(len(old_fields))):
-                try:
+    def forget_message(self, msg) -> None:
+        '''
+        Removes a message, which doesn't exist anymore, from all live message lists
+        '''
 
-                    # Update message
-                    await msg.edit(embed=new_embed)
+        if msg in self.control_board_messages:
+            self.control_board_messages.remove(msg)
 
-                except discord.errors.NotFound:
+        if msg in self.lyrics_messages:
+            self.lyrics_messages.remove(msg)
+
+        for messages, _ in self.queuelist_messages:
+            if msg in messages:
+                messages.remove(msg)
 
-                    # Remove non-existent message from control board messages list
-                    log.warning("Control board message not found")
-                    if msg in self.control_board_messages:
-                        self.control_board_messages.remove(msg)
-    
     async def update_lyrics(self):
         '''
         Updates lyrics in sync with music
         '''
         
         # Increase verse index if necessary
-        while self.current_lyrics_index < len(self.current_lyrics) - 1 and self.current_lyrics[self.current_lyrics_index + 1].seconds <= self.song_timer + self.lyrics_timer:
+        while self.current_lyrics_index < len(self.current_lyrics) - 1 and self.current_lyrics[self.current_lyrics_index + 1].seconds <= self.clock.position + self.lyrics_timer:
             self.current_lyrics_index += 1
         
         # Decrease verse index if necessary
-        while self.current_lyrics_index > 0 and self.current_lyrics[self.current_lyrics_index - 1].seconds >= self.song_timer + self.lyrics_timer:
+        while self.current_lyrics_index > 0 and self.current_lyrics[self.current_lyrics_index - 1].seconds >= self.clock.position + self.lyrics_timer:
             self.current_lyrics_index -= 1
         
         # Create lyrics message strings
@@ -469,11 +663,7 @@ class MyClient(commands.Bot):
 
         # Update all messages
         for msg in self.lyrics_messages:
-            try:
-                if msg.content != new_msg:
-                    await msg.edit(content=new_msg)
-            except Exception as e:
-                log.error("Couldn't edit lyrics. " + str(e))
+            self.editor.edit(msg, new_msg, content=new_msg)
 
     async def show_full_lyrics(self, ctx):
         '''
@@ -559,27 +749,15 @@ class MyClient(commands.Bot):
                     return
 
                 # Get index of last song in queuelist
-                index = self.db.get_max_queue_id()
+                index = len(self.queue)
         
             # Check if more songs are available. Bypass if boption available
             if self.boption or (index and index >= self.queue_counter):
-                
-                # Search in database until next song is found
-                # Loop process until found, to prevent errors from gaps in database
-                while True:
-                    try:
-                        
-                        # Get song with current index
-                        db_result = self.db.execute(f"SELECT path, length, url, name FROM queuelist WHERE queue_id = {self.queue_counter}")
-                        path = db_result[0][0]
-                        url = db_result[0][2]
-                        break
-
-                    except IndexError:
 
-                        # Increase index by 1 and repeat process
-                        log.warning("Gap in queue_id list!")
-                        self.queue_counter += 1
+                # Get song with current index
+                track = self.queue.get(self.queue_counter)
+                path = track.path
+                url = track.url
                 
                 # Check whehter to play a song that hasn't been downloaded
                 if path == '':
@@ -593,13 +771,16 @@ class MyClient(commands.Bot):
 
                         else:
 
-                            # Get audio source though youtube-dl without before options
-                            source = await YTDLSource.from_url(url, loop=self.loop, stream=True)
+                            # Get audio source though youtube-dl without before options,
+                            # using the video data resolved in advance if available
+                            data = await self.prefetcher.take(track)
+                            source = await YTDLSource.from_url(url, loop=self.loop, stream=True, data=data)
 
                     except Exception as e:
 
                         # Reset player, since song can't be played
                         log.error("Couldn't get source of song " + str(e))
+                        extraction_cache.invalidate(url)
                         self.reset_player()
                         self.queue_counter += 1
                         return
@@ -613,42 +794,42 @@ class MyClient(commands.Bot):
                     if self.boption:
 
                         # Get audio source and pass before options
-                        source = discord.FFmpegOpusAudio(
-                            path,
-                            before_options=self.boption
-                        )
+                        source = await self.create_file_source(track, before_options=self.boption)
                         log.info("Boptions loaded")
 
                     else:
 
                         # Get audio source without any additional before options
-                        source = discord.FFmpegOpusAudio(path)
+                        source = await self.create_file_source(track)
                 
-                # Delete boptions, as they won't be needed anymore
+                # Get start position and delete boptions, as they won't be needed anymore
+                position = self.boption_position if self.boption else 0
                 self.boption = False
+                self.boption_position = 0
 
                 # Reset song timer
-                self.song_timer = 0
-
-                # Wait half a second
-                await asyncio.sleep(0.5)
+                self.clock.stop()
 
                 # Start player
                 log.info("Playing song")
                 self.vc.play(source, after=self.song_done)
 
-                # Save current datetime
-                self.now = datetime.datetime.now()
+                # Start song timer at the position the player starts at
+                self.clock.restart(position)
+
+                # Resolve the following tracks while this one plays
+                self.prefetch_next()
 
                 # Stop waiting if was waiting
                 self.waiting = False
 
                 # Get current track name and duration
-                self.current_track_name = db_result[0][3]
-                self.current_track_duration = db_result[0][1]
+                self.current_track = track
+                self.current_track_name = track.name
+                self.current_track_duration = track.length
 
                 # Set track thumbnail
-                _id = convert_url(db_result[0][2], id_only=True)
+                _id = convert_url(track.url, id_only=True)
                 self.current_thumbnail = f"https://i.ytimg.com/vi/{_id}/mqdefault.jpg"
 
             else:
@@ -658,6 +839,9 @@ class MyClient(commands.Bot):
                 # Wait for next track
                 self.waiting = True
 
+                # Stop song timer
+                self.clock.stop()
+
                 # Empty current song data
                 self.reset_current_song_data()
 
@@ -680,38 +864,73 @@ class MyClient(commands.Bot):
         # Update status to current song
         await self.update_status()
         
-    @tasks.loop(seconds=0.1)
-    async def update_duration(self):
+    def get_next_update_delay(self) -> float:
         '''
-        Gets called ten times a second to update song timer
-        and check if any messages need to be updated
+        Returns the seconds until a progress display changes next,
+        that is the next cell of the progress bar or the next line of lyrics
+        Returns None if nothing will change unless an event occurs
         '''
 
-        # Check if playing music
-        if self.vc and self.vc.is_playing():
+        # Nothing changes while song timer is frozen
+        if not self.clock.running:
+            return None
 
-            # Add time passed between previous loop und current time
-            # to the song timer
-            dif = datetime.datetime.now() - self.now
-            self.song_timer += dif.seconds + dif.microseconds / 1000000
+        song_timer = self.clock.position
+        delays = []
 
-            # Store current datetime
-            self.now = datetime.datetime.now()
-    
-            # Check if current track name is available and
-            # if song timer has recently hit a new second
-            if self.current_track_name and self.song_timer - math.floor(self.song_timer) < 0.15:
-                
-                # Check if any control board messages exist
-                if len(self.control_board_messages):
+        # Time until the next cell of the progress bar gets filled
+        if self.current_track_name and len(self.control_board_messages):
+            change = string_creator.get_next_progress_change(self.current_track_name, song_timer, self.current_track_duration)
+            if change is not None:
+                delays.append(change - song_timer)
+
+        # Time until the next line of lyrics is reached
+        if len(self.lyrics_messages) and self.current_lyrics_index < len(self.current_lyrics) - 1:
+            change = self.current_lyrics[self.current_lyrics_index + 1].seconds - self.lyrics_timer
+            delays.append(change - song_timer)
+
+        if not delays:
+            return None
 
-                    # Update control board messages
+        # Wake up slightly after the change, so that it is already visible
+        return max(min(delays), 0) + 0.01
+
+    async def progress_loop(self) -> None:
+        '''
+        Sleeps until the next progress display changes or an event occurs
+        and updates control board and lyrics messages afterwards
+        '''
+
+        while True:
+
+            # Events which occur from now on wake up the loop immediately
+            self.progress_event.clear()
+
+            # Compute next wake up, wait for an event if that fails
+            try:
+                delay = self.get_next_update_delay()
+            except Exception as e:
+                log.error("Couldn't compute next progress update. Error: " + str(e))
+                delay = None
+
+            try:
+                await asyncio.wait_for(self.progress_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+
+                # Update control board messages
+                if self.current_track_name and len(self.control_board_messages):
                     await self.update_control_board_messages()
-            
-            # Update lyrics if there are any lyrics messages
-            if len(self.lyrics_messages):
-                await self.update_lyrics()
-            
+
+                # Update lyrics if there are any lyrics messages
+                if len(self.lyrics_messages):
+                    await self.update_lyrics()
+
+            except Exception as e:
+                log.error("Couldn't update progress displays. Error: " + str(e))
+
     @tasks.loop(count=1)
     async def reset_player_loop(self):
         '''
@@ -0,0 +1,99 @@
+'''
+Contains the PlaybackClock class
+'''
+import logging
+import time
+log = logging.getLogger(__name__)
+
+
+class PlaybackClock:
+    '''
+    Keeps track of the position within the current track
+    The position is derived from a monotonic clock anchored at the last play, pause or seek event,
+    hence it neither drifts under event loop lag nor jumps when the system clock changes
+    Parameters:
+        on_change: Optional callback, which gets called after every event
+    '''
+
+    def __init__(self, on_change=None) -> None:
+
+        # Position at the last event in seconds
+        self.offset = 0.0
+
+        # Monotonic time of the last event, None while paused
+        self.anchor = None
+
+        self.on_change = on_change
+
+    @property
+    def position(self) -> float:
+        '''
+        Seconds of the current track which have been played
+        '''
+
+        if self.anchor is None:
+            return self.offset
+
+        return self.offset + time.monotonic() - self.anchor
+
+    @property
+    def running(self) -> bool:
+        '''
+        Indicates whether the position is advancing
+        '''
+        return self.anchor is not None
+
+    def play(self) -> None:
+        '''
+        Lets the position advance from where it is
+        '''
+
+        if self.anchor is None:
+            self.anchor = time.monotonic()
+            self.changed()
+
+    def pause(self) -> None:
+        '''
+        Freezes the position
+        '''
+
+        if self.anchor is not None:
+            self.offset = self.position
+            self.anchor = None
+            self.changed()
+
+    def seek(self, position: float) -> None:
+        '''
+        Jumps to position, keeps advancing if it was advancing
+        '''
+
+        self.offset = float(position)
+        if self.anchor is not None:
+            self.anchor = time.monotonic()
+        self.changed()
+
+    def restart(self, position: float = 0) -> None:
+        '''
+        Lets the position advance from position, used when a track starts playing
+        '''
+
+        self.offset = float(position)
+        self.anchor = time.monotonic()
+        self.changed()
+
+    def stop(self) -> None:
+        '''
+        Freezes the position at the start of the track
+        '''
+
+        self.offset = 0.0
+        self.anchor = None
+        self.changed()
+
+    def changed(self) -> None:
+        '''
+        Notifies the listener about an event
+        '''
+
+        if self.on_change:
+            self.on_change()
@@ -0,0 +1,80 @@
+'''
+Contains the Prefetcher class
+'''
+import asyncio
+import logging
+from ytdl_source import YTDLSource
+log = logging.getLogger(__name__)
+
+# Number of upcoming tracks whose stream urls are resolved in advance
+PREFETCH_DEPTH = 2
+
+
+class Prefetcher:
+    '''
+    Resolves the stream urls of the next tracks in the background while the current one plays,
+    so that streamed tracks can start without waiting for youtube-dl
+    Results are bound to the track ids, tracks which aren't upcoming anymore
+    (e.g. after skipping, shuffling or removing tracks) are discarded
+    The results are kept in the extraction cache, which resolves them again once their stream urls expire
+    Parameters:
+        loop:  The event loop
+        depth: Number of upcoming tracks to resolve
+    '''
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, depth: int = PREFETCH_DEPTH) -> None:
+        self.loop = loop
+        self.depth = depth
+
+        # Resolving tasks, mapped by track id and url
+        self.tasks = dict()
+
+    def update(self, tracks: list) -> None:
+        '''
+        Starts resolving the streamed ones of tracks and discards all other results
+        '''
+
+        # Downloaded tracks don't need to be resolved
+        wanted = list((track.id, track.url) for track in tracks[:self.depth] if track.path == '')
+
+        # Discard tracks which aren't upcoming anymore
+        for key in list(self.tasks):
+            if key not in wanted:
+                self.tasks.pop(key).cancel()
+
+        # Resolve new upcoming tracks
+        for key in wanted:
+            if key not in self.tasks:
+                log.info(f"Prefetching {key[1]}")
+                self.tasks[key] = self.loop.create_task(YTDLSource.extract_info(key[1], loop=self.loop, stream=True))
+
+    async def take(self, track) -> dict:
+        '''
+        Returns the extracted data of track and forgets it
+        Waits if it is still being resolved, returns None if it wasn't prefetched or resolving failed
+        Data whose stream urls have expired in the meantime, e.g. during a long track, is resolved again
+        '''
+
+        task = self.tasks.pop((track.id, track.url), None)
+        if not task:
+            return None
+
+        try:
+            await task
+
+            # Take the data from the extraction cache, which checks its expiry
+            return await YTDLSource.extract_info(track.url, loop=self.loop, stream=True)
+
+        except Exception as e:
+            log.warning("Prefetching failed. Error: " + str(e))
+            return None
+
+    def clear(self) -> None:
+        '''
+        Discards all results
+        '''
+
+        for task in self.tasks.values():
+            task.cancel()
+
+        self.tasks = dict()
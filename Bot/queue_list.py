@@ -0,0 +1,338 @@
+'''
+Keeps the queue list in memory and writes its changes to the database in the background
+'''
+import asyncio
+import logging
+import os
+import random
+from collections import namedtuple
+from database import AsyncDatabase, QUEUE_KEY_GAP
+
+log = logging.getLogger(__name__)
+
+# Seconds to wait after a change, so that following changes are written in the same batch
+WRITE_DELAY = 0.5
+
+# Number of attempts to read the queue list from the database on startup
+LOAD_ATTEMPTS = 3
+
+# Compact record of a single track in the queue list
+# The key determines the order of the tracks in the database
+# The gain in dB is applied to downloaded tracks during playback
+Track = namedtuple("Track", ["id", "key", "url", "path", "length", "name", "gain"], defaults=[0])
+
+
+class QueueList:
+    '''
+    Authoritative in-memory queue list, the queuelist table only serves as its persistent copy
+    Positions are one-based. The position of the current track (the queue_counter of MyClient)
+    is persisted along with the tracks, so that the queue list resumes from it after a restart
+    In the database, the tracks are ordered by keys with gaps in between,
+    so that inserting a track only writes the new track instead of renumbering all following ones
+    Parameters:
+        db: The AsyncDatabase object which stores the queue list
+    '''
+
+    def __init__(self, db: AsyncDatabase) -> None:
+        self.db = db
+
+        # All tracks in the order they are played
+        self.tracks = []
+
+        # Id of the next created track
+        self.next_id = 1
+
+        # Position of the current track
+        self.position = 1
+
+        # Indicates whether the position hasn't been written to the database yet
+        self.position_changed = False
+
+        # All tracks which haven't been written to the database yet, mapped by their id
+        self.dirty = dict()
+
+        # Ids of all removed tracks which haven't been deleted from the database yet
+        self.removed = set()
+
+        # Indicates whether the table has to be emptied before writing
+        self.cleared = False
+
+        # Is set whenever there are unwritten changes
+        self.changed = asyncio.Event()
+
+        # Guarantees that batches are written in order
+        self.write_lock = asyncio.Lock()
+
+        # Background task which writes all changes
+        self.writer = None
+
+        # Indicates whether the background task keeps writing changes
+        self.running = False
+
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def get(self, position: int) -> Track:
+        '''
+        Returns the track at position or None if there is none
+        '''
+
+        if 1 <= position <= len(self.tracks):
+            return self.tracks[position - 1]
+
+    def window(self, position: int, amount: int = None) -> list:
+        '''
+        Returns amount tracks starting at position
+        Returns all following tracks if amount is None
+        '''
+
+        start = max(position - 1, 0)
+
+        if amount is None:
+            return self.tracks[start:]
+
+        return self.tracks[start: start + amount]
+
+    def insert(self, position: int, entries: list) -> list:
+        '''
+        Inserts tracks at position, or at the end of the queue list if position is 0
+        Each entry is a tuple containing url, path, length, name and optionally gain
+        Returns the created tracks
+        '''
+
+        # Add tracks at the end if position is not specified or too high
+        if not position or position > len(self.tracks):
+            position = len(self.tracks) + 1
+
+        index = position - 1
+
+        # Get the keys of the neighbouring tracks
+        low = self.tracks[index - 1].key if index > 0 else 0
+        if index < len(self.tracks):
+            high = self.tracks[index].key
+        else:
+            high = low + QUEUE_KEY_GAP * (len(entries) + 1)
+
+        # Spread the new keys evenly between the neighbours
+        step = (high - low) // (len(entries) + 1)
+
+        # Create track records
+        tracks = list(Track(self.next_id + i, low + step * (i + 1), *entry) for i, entry in enumerate(entries))
+        self.next_id += len(tracks)
+
+        self.tracks[index:index] = tracks
+
+        # Make room if there was no free key left between the neighbours
+        if step < 1:
+            self.rebalance()
+        else:
+            self.mark_dirty(tracks)
+
+        log.info(f"Inserted {len(tracks)} tracks at position {position}")
+
+        return tracks
+
+    def shuffle(self, position: int, seed: int = None) -> None:
+        '''
+        Shuffles all tracks from position onwards
+        Passing a seed makes the resulting order reproducible
+        The new order is written with a single batch, as only the keys of the tracks change
+        '''
+
+        index = max(position - 1, 0)
+
+        log.info(f"Shuffling {len(self.tracks) - index} tracks, seed: {seed}")
+
+        following = self.tracks[index:]
+        random.Random(seed).shuffle(following)
+
+        # Hand out the keys of the shuffled positions in their new order
+        keys = list(e.key for e in self.tracks[index:])
+        following = list(track._replace(key=key) for track, key in zip(following, keys))
+        self.tracks[index:] = following
+
+        self.mark_dirty(following)
+
+    def remove(self, condition) -> list:
+        '''
+        Removes all tracks for which condition returns True
+        Returns the positions the removed tracks had
+        '''
+
+        positions = list(i for i, track in enumerate(self.tracks, start=1) if condition(track))
+        if not positions:
+            return positions
+
+        log.info(f"Removing {len(positions)} tracks")
+
+        # Remove tracks
+        removed = set(self.tracks[i - 1].id for i in positions)
+        self.tracks = list(e for e in self.tracks if e.id not in removed)
+
+        # Mark tracks for deletion
+        for _id in removed:
+            self.dirty.pop(_id, None)
+        self.removed.update(removed)
+        self.changed.set()
+
+        return positions
+
+    def rebalance(self) -> None:
+        '''
+        Spreads the keys of all tracks evenly
+        '''
+
+        log.info(f"Rebalancing keys of {len(self.tracks)} tracks")
+
+        self.tracks = list(track._replace(key=QUEUE_KEY_GAP * i) for i, track in enumerate(self.tracks, start=1))
+        self.mark_dirty(self.tracks)
+
+    def clear(self) -> None:
+        '''
+        Removes all tracks
+        '''
+
+        log.info("Clearing queue list")
+
+        self.tracks = []
+        self.dirty = dict()
+        self.removed = set()
+        self.cleared = True
+        self.move_to(1)
+        self.changed.set()
+
+    def move_to(self, position: int) -> None:
+        '''
+        Sets the position of the current track
+        '''
+
+        if position != self.position:
+            self.position = position
+            self.position_changed = True
+            self.changed.set()
+
+    def mark_dirty(self, tracks) -> None:
+        '''
+        Marks tracks as not yet written
+        '''
+
+        for track in tracks:
+            self.dirty[track.id] = track
+
+        self.changed.set()
+
+    async def load(self) -> None:
+        '''
+        Loads the queue list from database
+        If it can't be read, the queue list starts empty and the table is emptied with the first write,
+        as tracks created with ids of existing rows would otherwise be mixed up with them
+        '''
+
+        for attempt in range(LOAD_ATTEMPTS):
+
+            # The database returns None if the query failed
+            rows = await self.db.get_queuelist()
+            if rows is not None:
+                break
+
+            log.warning(f"Attempt {attempt + 1} to load queue list failed")
+            if attempt < LOAD_ATTEMPTS - 1:
+                await asyncio.sleep(2 ** attempt)
+
+        else:
+            log.error("Couldn't load queue list, starting with an empty one")
+            self.clear()
+            return
+
+        self.tracks = list(Track(*row) for row in rows)
+        self.next_id = 1 + max((e.id for e in self.tracks), default=0)
+
+        # Continue after the tracks which have already been played
+        position = await self.db.get_queue_position() or 1
+        self.position = max(1, min(position, len(self.tracks) + 1))
+
+        # Stream tracks whose downloaded files don't exist anymore
+        for i, track in enumerate(self.tracks):
+            if track.path and not os.path.exists(track.path):
+                self.tracks[i] = track._replace(path='')
+                self.mark_dirty([self.tracks[i]])
+
+        log.info(f"Loaded {len(self.tracks)} tracks from database, current position: {self.position}")
+
+    def start(self) -> None:
+        '''
+        Starts writing changes to the database in the background
+        '''
+
+        self.running = True
+        if not self.writer or self.writer.done():
+            self.writer = asyncio.ensure_future(self.write_loop())
+
+    async def stop(self) -> None:
+        '''
+        Stops writing changes in the background, remaining changes have to be written with flush
+        Waits until a batch which is being written is finished, so that it can't be lost or overtake later batches
+        '''
+
+        self.running = False
+
+        if self.writer:
+
+            # Wake up the writer, so that it notices it has to stop
+            self.changed.set()
+            await self.writer
+            self.writer = None
+
+    async def write_loop(self) -> None:
+        '''
+        Waits for changes and writes them in batches
+        '''
+
+        while self.running:
+            await self.changed.wait()
+
+            if not self.running:
+                return
+
+            # Collect further changes for a short time
+            await asyncio.sleep(WRITE_DELAY)
+
+            await self.flush()
+
+    async def flush(self) -> None:
+        '''
+        Writes all pending changes to the database within one transaction
+        '''
+
+        async with self.write_lock:
+
+            self.changed.clear()
+
+            # Check whether there is anything to write
+            if not self.dirty and not self.removed and not self.cleared and not self.position_changed:
+                return
+
+            # Take the pending changes
+            dirty, removed, cleared = self.dirty, self.removed, self.cleared
+            self.dirty, self.removed, self.cleared = dict(), set(), False
+            position = self.position if self.position_changed else None
+            self.position_changed = False
+
+            rows = list((e.id, e.key, e.url, e.path, e.length, e.name, e.gain) for e in dirty.values())
+
+            # The database closes the gaps of removed tracks by spreading all keys evenly,
+            # the same is done here, so that following changes use the new keys
+            if removed:
+                self.tracks = list(e._replace(key=QUEUE_KEY_GAP * i) for i, e in enumerate(self.tracks, start=1))
+
+            # Write changes and keep them pending if that failed,
+            # unless the queue list has been cleared in the meantime
+            if not await self.db.persist_queue(rows, cleared, list(removed), position) and not self.cleared:
+                self.cleared = cleared
+                self.removed.update(removed)
+                self.position_changed = self.position_changed or position is not None
+
+                # Tracks which have been removed in the meantime must not be written again
+                live = set(e.id for e in self.tracks)
+                pending = list(e for e in dirty.values() if e.id not in self.dirty and e.id not in self.removed and e.id in live)
+                self.mark_dirty(self.tracks if removed else pending)
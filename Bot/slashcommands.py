@@ -320,7 +320,15 @@ repeat = {
 
 shuffle = {
     "name": "shuffle",
-    "description": "Shuffles the playlist"
+    "description": "Shuffles the playlist",
+    "options": [
+        {
+            "name": "seed",
+            "description": "Shuffle reproducibly, the same seed results in the same order",
+            "type": 4,
+            "required": False
+        }
+    ]
 }
 
 lyrics = {
@@ -362,18 +370,14 @@ def get() -> str:
     return r.text
 
 
-def update_playlist_commands() -> None:
+def update_playlist_commands(names: list) -> None:
     '''
     Updates all commands that contain choices based on the downloaded playlists
+    Names contains the names of all playlists
     '''
 
-    from file_manager import get_playlists
-
-    # Get all playlists that have an existing directory
-    choices = get_playlists()
-
     # Convert the list elements to the right format
-    choices = list(({"name": f"{e}", "value": f"{e}"} for e in choices))
+    choices = list(({"name": f"{e}", "value": f"{e}"} for e in names))
 
     # Create play, update and delete commands with new playlist choices
     play = get_playlist_command(choices)
@@ -2,22 +2,59 @@
 Creates strings and brings them into the right format
 '''
 import logging
+from functools import lru_cache
 from discord import Embed
-import tkinter
-from tkinter import font as tkFont
 from typing import List
 from lyricsgenius.api import Song
 log = logging.getLogger(__name__)
 
+# Advance widths of the printable ascii characters in Arial Bold, the font of embed titles,
+# in thousandths of the font size, starting at the space character
+TITLE_GLYPH_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,  # space to /
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,  # 0 to ?
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,  # @ to O
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,  # P to _
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,  # ` to o
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,       # p to ~
+]
+
+# Advance width of other characters, wide east asian characters take a full em
+DEFAULT_GLYPH_WIDTH = 556
+WIDE_GLYPH_WIDTH = 1000
+
+# Advance width of a progress bar cell ('░' in Arial)
+BAR_CELL_WIDTH = 722
+
+# Maximum number of progress bar cells
+MAX_BAR_LENGTH = 39
+
 # TODO end of lyrics
 
-def create_queue_string(queuelist: list, amount: int) -> List[str]:
+@lru_cache(maxsize=1024)
+def create_queue_entry_string(name: str, length: int) -> str:
     '''
-    Creates queue list string
+    Creates the line of a single track in the queue list
+    The result is memorized, so that shifting the queue list only numbers the lines anew
     '''
 
     from main import convert_time
 
+    # Convert song duration and bring it into the right format
+    length = convert_time(length)
+    length = f"{str(length[0]) + ':' if length[0] else ''}{str(length[1]).zfill(2)}:{str(length[2]).zfill(2)}"
+
+    # Limit song title to 60 characters and remove all '*' and '_' chars
+    name_string = f"{name if len(name) < 60 else name[:60] + '...'} ({length})"
+    return name_string.replace("_", " ").replace("*", " ")
+
+
+def create_queue_string(queuelist: list, amount: int) -> List[str]:
+    '''
+    Creates queue list string from a list of Track records
+    Only the first amount + 1 records are used, the current track and amount following ones
+    '''
+
     # Create containers
     msg_list = []
     new_msg = ""
@@ -26,16 +63,8 @@ def create_queue_string(queuelist: list, amount: int) -> List[str]:
 
     for i, entry in enumerate(queuelist):
 
-        # Get song title
-        name = entry[0]
-
-        # Convert song duration and bring it into the right format
-        length = convert_time(int(entry[1]))
-        length = f"{str(length[0]) + ':' if length[0] else ''}{str(length[1]).zfill(2)}:{str(length[2]).zfill(2)}"
-        
-        # Limit song title to 60 characters and remove all '*' and '_' chars
-        name_string = f"{name if len(name) < 60 else name[:60] + '...'} ({length})"
-        name_string = name_string.replace("_", " ").replace("*", " ")
+        # Get formatted song title and duration
+        name_string = create_queue_entry_string(entry.name, int(entry.length))
 
         # Write 'current track' at start of message
         if i == 0:
@@ -75,18 +104,96 @@ def create_queue_string(queuelist: list, amount: int) -> List[str]:
     return msg_list
 
 
-def create_control_board_message_embed(name: str, song_timer: int, track_duration: int, url: str) -> Embed:
+def create_control_board_title(name: str, track_duration: int) -> str:
     '''
-    Creates control board message embed and returns the result
-    Consists of a thumbnail, current track name, a progress bar and six buttons
+    Creates the title of a control board message, the track name and its duration
     '''
 
     from main import convert_time
 
-    log.debug("Creating control board message string")
-
     cctd = convert_time(track_duration)  # Converted current track duration
 
+    # Limit title length to 60 chars and append total song duration
+    return f"{name if len(name) < 60 else name[:60] + '...'} ({(str(cctd[0])+':') if cctd[0] else ''}{str(cctd[1]).zfill(2) + ':' + str(cctd[2]).zfill(2)})"
+
+
+def get_text_width(text: str) -> int:
+    '''
+    Estimates the width of text in the embed title font, in thousandths of the font size
+    '''
+
+    width = 0
+    for char in text:
+        code = ord(char)
+        if 32 <= code < 127:
+            width += TITLE_GLYPH_WIDTHS[code - 32]
+        elif code >= 0x1100:
+            width += WIDE_GLYPH_WIDTH
+        else:
+            width += DEFAULT_GLYPH_WIDTH
+
+    return width
+
+
+@lru_cache(maxsize=64)
+def get_progress_bar_length(title: str) -> int:
+    '''
+    Calculates how many cells the progress bar needs to be as wide as the title
+    The result is memorized, as the title stays the same for the whole track
+    '''
+
+    length = int(get_text_width(title) / BAR_CELL_WIDTH) + 1
+
+    # Limit bar length
+    return min(length, MAX_BAR_LENGTH)
+
+
+def get_next_progress_change(name: str, song_timer: float, track_duration: int) -> float:
+    '''
+    Returns the song timer value at which the next cell of the progress bar gets filled
+    Returns None if no more cells will be filled
+    '''
+
+    track_duration = int(track_duration)
+    if track_duration <= 1:
+        return None
+
+    length = get_progress_bar_length(create_control_board_title(name, track_duration))
+
+    # Cell i is filled once i / length <= timer / (duration - 1), see get_progress_bar_cells
+    # Integer arithmetic keeps both functions in agreement
+    filled = min(int(song_timer) * length // (track_duration - 1), length)
+    if filled >= length:
+        return None
+
+    # The bar is drawn from whole seconds, so the next cell appears at a whole second
+    change = -(-(filled + 1) * (track_duration - 1) // length)
+
+    return float(max(change, int(song_timer) + 1))
+
+
+def get_progress_bar_cells(name: str, song_timer: int, track_duration: int) -> int:
+    '''
+    Returns the number of filled cells of the progress bar
+    '''
+
+    track_duration = int(track_duration)
+    if not name or track_duration <= 1:
+        return 0
+
+    length = get_progress_bar_length(create_control_board_title(name, track_duration))
+
+    return sum(1 for i in range(1, length + 1) if i / length <= song_timer / (track_duration - 1))
+
+
+def create_control_board_message_embed(name: str, filled: int, track_duration: int, url: str, paused: bool = False) -> Embed:
+    '''
+    Creates control board message embed and returns the result
+    Consists of a thumbnail, current track name and a progress bar with filled cells
+    '''
+
+    log.debug("Creating control board message string")
+
     # Create new embed and set thumbnail
     embed = Embed()
     if url:
@@ -97,34 +204,17 @@ def create_control_board_message_embed(name: str, song_timer: int, track_duratio
         embed.title = "No Current Track"
         return embed
 
-    # Limit title length to 60 chars and append total song duration
-    title = f"{name if len(name) < 60 else name[:60] + '...'} ({(cctd[0]+':') if cctd[0] else ''}{str(cctd[1]).zfill(2) + ':' + str(cctd[2]).zfill(2)})"
-
     # Set song title as embed title
+    title = create_control_board_title(name, track_duration)
     embed.title = title
     
-    # Try to calculate length of title text and adapt the length of the progress bar
-    tkinter.Frame().destroy()
-    arial16b = tkFont.Font(family='Arial', size=16, weight="bold")
-    arial16n = tkFont.Font(family='Arial', size=16, weight="normal")
-    title_width = arial16b.measure(title)
-    unit_width = arial16n.measure("░")
-    length = int(title_width / unit_width) + 1
-
-    # Limit bar length to 39
-    if length > 39:
-        length = 39
+    length = get_progress_bar_length(title)
     
     # Create progress bar
-    progress_bar = ""
-    for i in range(1, length + 1):
-        if i / length <= song_timer / (track_duration - 1):
-            progress_bar += '█'
-        else:
-            progress_bar += '░'
+    progress_bar = '█' * filled + '░' * (length - filled)
 
     # Add progress bar as a field
-    embed.add_field(name="Progress:", value=progress_bar, inline=False)
+    embed.add_field(name="Paused:" if paused else "Progress:", value=progress_bar, inline=False)
 
     return embed
 
@@ -211,3 +301,14 @@ def create_playlist_download_string(msg: str, index: int, li: list):
     '''
 
     return f"{msg} ({index}/{len(li)})"
+
+
+def create_playlist_finished_string(msg: str, failed: int):
+    '''
+    Creates a string that shows the result of a playlist download
+    '''
+
+    if not failed:
+        return msg
+
+    return f"{msg}, {failed} track{'s' if failed != 1 else ''} couldn't be downloaded"
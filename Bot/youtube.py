@@ -108,6 +108,39 @@ class YouTube:
 
             log.error("Search failed. Error: " + str(e))
 
+    async def get_names(self, _ids: list) -> dict:
+        '''
+        Gets the names of multiple youtube videos, requesting 50 ids at a time
+        Returns a dict which maps the ids to their names, invalid ids are left out
+        '''
+
+        log.info(f"Getting names of {len(_ids)} videos")
+
+        names = dict()
+
+        for entry in get_split_list(_ids, 50):
+
+            # Skip empty lists
+            if not entry:
+                continue
+
+            try:
+
+                # Perform search query
+                response = await self.video_list_query("snippet", ",".join(entry))
+
+                assert response
+
+                # Extract titles
+                for item in response["items"]:
+                    names[item["id"]] = item["snippet"]["title"]
+
+            except Exception as e:
+
+                log.error("Search failed. Error: " + str(e))
+
+        return names
+
     async def get_search(self, keyword: str, amount: int = 1, search_type: str = "video", full_url: bool = True) -> list:
         '''
         Performs a youtube search
@@ -4,6 +4,7 @@ Creates youtube-dl sources
 import youtube_dl
 import discord
 import asyncio
+from extraction_cache import ExtractionCache
 
 # Some youtube-dl settings I found online
 ytdl_format_options = {
@@ -27,39 +28,57 @@ ytdl_format_options = {
 }
 
 # Set ffmpeg_options to audio only
-ffmpeg_options = {
-    'options': '-vn',
-}
+ffmpeg_options = '-vn'
 
 # Create youtube-dl object
 ytdl = youtube_dl.YoutubeDL(ytdl_format_options)
 
+# Shared cache of extracted video data
+extraction_cache = ExtractionCache(lambda url: ytdl.extract_info(url, download=False))
+
 
-class YTDLSource(discord.PCMVolumeTransformer):
+class YTDLSource(discord.FFmpegOpusAudio):
     '''
     Acts as a audio source, without having to download the song
+    The volume is changed and the audio is encoded by ffmpeg,
+    so no PCM has to be processed in python
     Paramters:
-        source: The audio source
+        source: Url of the audio stream
         data: Extracted video data
+        before_options: Ffmpeg options applied before the input
         volume: Audio volume
     '''
-    def __init__(self, source, *, data, volume=0.1):
-        super().__init__(source, volume)
+    def __init__(self, source, *, data, before_options=None, volume=0.1):
+        super().__init__(source, before_options=before_options, options=f"{ffmpeg_options} -af volume={volume}")
 
         self.data = data
         self.title = data.get('title')
         self.url = data.get('url')
 
-    @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False, before_options=False):
+    @staticmethod
+    async def extract_info(url, *, loop=None, stream=False):
         '''
-        Creates a YTDLSource instance
+        Extracts the video data of url, without blocking the event loop
+        Data of streams is taken from the extraction cache if possible
         '''
 
+        if stream:
+            return await extraction_cache.get(url, loop=loop)
+
         loop = loop or asyncio.get_event_loop()
 
+        return await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=True))
+
+    @classmethod
+    async def from_url(cls, url, *, loop=None, stream=False, before_options=False, data=None):
+        '''
+        Creates a YTDLSource instance
+        Data can be passed if the video data has already been extracted
+        '''
+
         # Extract video data
-        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(url, download=not stream))
+        if not data:
+            data = await cls.extract_info(url, loop=loop, stream=stream)
 
         # Assign filename
         filename = data['url'] if stream else ytdl.prepare_filename(data)
@@ -73,4 +92,4 @@ class YTDLSource(discord.PCMVolumeTransformer):
             boptions += before_options
 
         # Return instance of YTDLSource class with specified settings
-        return cls(discord.FFmpegPCMAudio(filename, before_options=boptions, **ffmpeg_options), data=data)
+        return cls(filename, data=data, before_options=boptions)